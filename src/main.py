@@ -15,10 +15,23 @@ Central Orchestrator (main layer)
 """
 
 import asyncio
+import copy
+import functools
 import json
 import re
-from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Tuple
 from pathlib import Path
+from types import MappingProxyType, SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
 
 """Top-level optional imports for the Agentscope runtime.
 
@@ -29,17 +42,10 @@ be available; otherwise a clear error is raised when used.
 """
 
 try:  # optional at import time (unit tests may not install agentscope)
-    from agentscope.agent import AgentBase, ReActAgent  # type: ignore
     from agentscope.message import Msg  # type: ignore
     from agentscope.pipeline import MsgHub  # type: ignore
 except Exception:  # pragma: no cover - provide light stubs for tests
 
-    class AgentBase:  # type: ignore
-        pass
-
-    class ReActAgent:  # type: ignore
-        pass
-
     class Msg:  # type: ignore
         pass
 
@@ -47,16 +53,39 @@ except Exception:  # pragma: no cover - provide light stubs for tests
         pass
 
 
-from dataclasses import asdict, is_dataclass, dataclass, field
+import atexit
+import logging
+import os
+import sys
+import time
+import weakref
+from collections import deque
+from dataclasses import asdict, dataclass, field, is_dataclass
 from datetime import datetime, timezone
 from enum import Enum
 from itertools import count
-from threading import Lock
+from threading import Lock, Thread
 
-import logging
-import os
 import world.tools as world_impl
 
+try:  # optional: C-accelerated JSON parsing (returns the same dict/list/str types)
+    import orjson  # type: ignore
+
+    _json_loads: Callable[[Any], Any] = orjson.loads
+except Exception:  # pragma: no cover - stdlib fallback
+    orjson = None  # type: ignore
+    _json_loads = json.loads
+
+
+def _json_dumps(obj: Any) -> str:
+    """Compact UTF-8 JSON text; orjson when available, stdlib for anything it rejects."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
+
 # ============================================================
 # Prompt & Context Policy (EDIT HERE to control model input)
 # ============================================================
@@ -75,6 +104,11 @@ CTX_INJECT_REACH_PREVIEW = True
 #   - "off": 不注入
 CTX_PRIVATE_SECTION_MODE = "memory"  # "system" | "memory" | "off"
 
+# Upper bound on NPC completions in flight at once; model.json
+# `npc.max_concurrency` overrides. Server sessions with the same limit share
+# one pool per event loop; a different limit gets its own pool.
+LLM_MAX_CONCURRENCY = 4
+
 # Whether to broadcast world/recap context to observers (does not directly feed the model,
 # but affects what goes into recap on future turns)
 CTX_BROADCAST_CONTEXT_TO_OBSERVERS = True
@@ -83,9 +117,15 @@ CTX_BROADCAST_CONTEXT_TO_OBSERVERS = True
 # to logs/prompts/*.txt so you can inspect exactly what was sent to the model.
 DEBUG_DUMP_PROMPTS = True
 
+# Per-agent memory cap (messages). Long-lived hub participants receive every
+# broadcast; only the newest messages are kept so memory stays flat over a session.
+CTX_AGENT_MEMORY_MAX_MSGS = 64
+
 # Recap limits (how many recent broadcasts are summarized)
 DEFAULT_RECAP_MSG_LIMIT = 6
 DEFAULT_RECAP_ACTION_LIMIT = 6
+# Ring size for the per-run action log (oldest entries are dropped)
+ACTION_LOG_MAX_ENTRIES = 256
 
 # System prompt building (tools list + templates)
 DEFAULT_TOOLS_TEXT = "perform_attack(), cast_arts(), advance_position(), adjust_relation(), transfer_item(), set_protection(), clear_protection(), first_aid()"
@@ -106,12 +146,14 @@ DEFAULT_PROMPT_RULES = (
     '- 当需要执行行动时，直接调用工具（格式：CALL_TOOL tool_name({{"key": "value"}}))。\n'
     "- 作战规则（硬性）：只能对reach_preview里的“可及目标”使用 perform_attack；若目标不在“可及目标”，必须先用 advance_position 进入触及范围后再发动攻击。\n"
     "- 有效行动要求：当存在敌对关系（关系<=-10）时，每回合至少进行一次有效行动。\n"
-    "- 行动前对照上方立场提示：≥40 视为亲密同伴（避免攻击、优先支援），≥10 为盟友（若要伤害需先说明理由），≤-10 才视为敌方目标，其余保持谨慎中立。\n"
+    "- 行动前对照下方立场提示：≥40 视为亲密同伴（避免攻击、优先支援），≥10 为盟友（若要伤害需先说明理由），≤-10 才视为敌方目标，其余保持谨慎中立。\n"
     "- 若必须违背既定关系行事或违反作战硬规则，请在对白中说明充分理由，并拒绝执行，同时给出更稳妥的替代行动。\n"
     '- 不要输出任何"系统提示"或括号内的系统旁白；只输出对白与 CALL_TOOL。\n'
-    "- 参与者名称（仅可用）：{allowed_names}\n"
 )
 
+# Same for every actor of a run, but differs between stories
+DEFAULT_PROMPT_PARTICIPANTS = "参与者名称（仅可用）：{allowed_names}\n"
+
 DEFAULT_PROMPT_TOOL_GUIDE = (
     "可用工具（必须提供行动理由）：\n"
     "- perform_attack(attacker, defender, weapon, reason)：使用指定武器发起攻击，仅能对“可及目标”使用。\n"
@@ -132,11 +174,18 @@ DEFAULT_PROMPT_EXAMPLE = (
 
 ## Removed guard guide/example blocks per request
 
-DEFAULT_PROMPT_TEMPLATE = (
-    DEFAULT_PROMPT_HEADER
-    + DEFAULT_PROMPT_RULES
-    + DEFAULT_PROMPT_TOOL_GUIDE
-    + DEFAULT_PROMPT_EXAMPLE
+# Order matters for provider-side prefix caching (Moonshot/OpenAI cache the
+# longest byte-identical prompt prefix): blocks go from most to least shared —
+# fixed rules/tools/example, then the run's participant list, then the
+# per-actor header (persona, relation brief).
+DEFAULT_PROMPT_TEMPLATE = "".join(
+    (
+        DEFAULT_PROMPT_RULES,
+        DEFAULT_PROMPT_TOOL_GUIDE,
+        DEFAULT_PROMPT_EXAMPLE,
+        DEFAULT_PROMPT_PARTICIPANTS,
+        DEFAULT_PROMPT_HEADER,
+    )
 )
 
 # World summary templates (rendered text; not called "系统提示"避免联想)
@@ -167,6 +216,9 @@ PRIV_SPEECH_SPEAKER = "- 说话者：{who}"
 PRIV_SPEECH_CONTENT = "- 内容：{text}"
 PRIV_SPEECH_REL = "- 你对该角色的关系：{score:+d}（{label}）"
 PRIV_TURN_RES_TITLE = "回合资源（仅你可见）："
+PRIV_TURN_RES_MOVE = "- 移动：{left}/{max} 步"
+PRIV_TURN_RES_ACTIONS = "- 动作：{action}；附赠动作：{bonus}；反应：{reaction}"
+PRIV_AVAIL_LABEL = {True: "可用", False: "已用"}  # keyed by "still available?"
 PRIV_DIST_TITLE = "距离提示（仅你可见）："
 PRIV_DIST_LINE = "- {who}：{dist}步"
 PRIV_DIST_UNKNOWN_LINE = "- {who}：未记录"
@@ -190,6 +242,8 @@ PRIV_STATUS_LORE = {
     "frozen": "- 冻结：低温抑制导致全身僵直（{duration}，无法行动）。",
 }
 PRIV_STATUS_LORE_DEFAULT = "- {state}：效果生效中（{duration}）"
+PRIV_STATUS_DURATION_TURNS = "剩余 {turns} 回合"
+PRIV_STATUS_DURATION_ONGOING = "持续"
 
 # === End of Policy ===
 
@@ -198,34 +252,83 @@ PRIV_STATUS_LORE_DEFAULT = "- {state}：效果生效中（{duration}）"
 # ============================================================
 
 
-def project_root() -> Path:
-    """Return repository root (folder that contains configs/ and src/).
+# How many directories above this file to search for configs/
+_PROJECT_ROOT_MAX_DEPTH = 8
+
 
-    Walk upwards from this file to find a directory that contains a
-    `configs/` folder. Fallback to two levels up from this file.
+def _compute_project_root() -> Path:
+    """Locate the repository root (folder that contains configs/ and src/).
+
+    Walk upwards from this file (at most _PROJECT_ROOT_MAX_DEPTH levels) to
+    find a directory that contains a `configs/` folder. Fallback to two levels
+    up from this file.
     """
-    here = Path(__file__).resolve()
-    for parent in here.parents:
-        if (parent / "configs").exists():
-            return parent
+    here = os.path.realpath(__file__)
+    cur = os.path.dirname(here)
+    for _ in range(_PROJECT_ROOT_MAX_DEPTH):
+        if os.path.isdir(os.path.join(cur, "configs")):
+            return Path(cur)
+        parent = os.path.dirname(cur)
+        if parent == cur:
+            break
+        cur = parent
+    parents = Path(here).parents
     try:
-        return (
-            here.parents[1]
-            if (here.parents[1] / "configs").exists()
-            else here.parents[2]
-        )
-    except Exception:
-        return here.parents[1]
+        return parents[2]
+    except IndexError:
+        return parents[1]
+
+
+# The checkout does not move while the process runs: resolve once at import.
+_PROJECT_ROOT = _compute_project_root()
+_CONFIGS_DIR = _PROJECT_ROOT / "configs"
+
+
+def project_root() -> Path:
+    """Return repository root (folder that contains configs/ and src/)."""
+    return _PROJECT_ROOT
 
 
 def _configs_dir() -> Path:
-    return project_root() / "configs"
+    return _CONFIGS_DIR
+
+
+def _prompts_dir(root: Optional[Path] = None) -> Path:
+    """Where per-actor prompt dumps are written (logs/prompts under the project root)."""
+    return (root or project_root()) / "logs" / "prompts"
+
+
+def _clear_prompt_dumps(root: Optional[Path] = None) -> None:
+    # Run/session start: drop previous dumps; only the latest per actor is kept during a run
+    try:
+        prompts_dir = _prompts_dir(root)
+        if prompts_dir.exists():
+            for _p in prompts_dir.glob("*.txt"):
+                try:
+                    _p.unlink()
+                except Exception:
+                    pass
+    except Exception:
+        pass
+
+
+@functools.lru_cache(maxsize=32)
+def _read_bytes_at(path: Path, mtime_ns: int, size: int, ino: int) -> bytes:
+    # keyed on (path, mtime, size, inode): an edited file misses the cache and is
+    # re-read; the inode catches replace()-style saves within mtime granularity
+    return path.read_bytes()
+
+
+def _read_config_bytes(path: Path) -> bytes:
+    st = path.stat()
+    return _read_bytes_at(path, st.st_mtime_ns, st.st_size, st.st_ino)
 
 
 def _load_json(path: Path) -> dict:
-    # no fallback: read and propagate errors if any
-    with path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
+    # no fallback: read and propagate errors if any.
+    # Only the file bytes are cached; every call parses afresh so callers own
+    # the returned objects (world tools keep references to nested config dicts).
+    data = _json_loads(_read_config_bytes(path))
     if not isinstance(data, dict):
         raise ValueError(f"expected object at {path}, got {type(data).__name__}")
     return data
@@ -308,26 +411,78 @@ def load_arts() -> dict:
 # Agent Factory (inline)
 # ============================================================
 
-try:  # optional at import time (unit tests may not install agentscope)
+if TYPE_CHECKING:  # pragma: no cover - annotations only
+    import argparse
+
+    from agentscope.agent import AgentBase, ReActAgent  # type: ignore
+    from agentscope.model import OpenAIChatModel  # type: ignore
+
+
+@functools.lru_cache(maxsize=None)
+def _llm_runtime() -> SimpleNamespace:
+    """Import the LLM-facing agentscope classes on first use.
+
+    These pull in openai/httpx/pydantic, which code paths that never build an
+    agent (log tooling, config validation, tests) should not pay for.
+    """
+    from agentscope.agent import ReActAgent  # type: ignore
     from agentscope.formatter import OpenAIChatFormatter  # type: ignore
     from agentscope.memory import InMemoryMemory  # type: ignore
     from agentscope.model import OpenAIChatModel  # type: ignore
     from agentscope.tool import Toolkit  # type: ignore
-except Exception:  # pragma: no cover - provide light stubs for tests
 
-    class OpenAIChatFormatter:  # type: ignore
-        pass
+    return SimpleNamespace(
+        ReActAgent=ReActAgent,
+        OpenAIChatFormatter=OpenAIChatFormatter,
+        InMemoryMemory=InMemoryMemory,
+        OpenAIChatModel=OpenAIChatModel,
+        Toolkit=Toolkit,
+    )
 
-    class InMemoryMemory:  # type: ignore
-        pass
 
-    class OpenAIChatModel:  # type: ignore
-        def __init__(self, *a, **k):
-            pass
+@functools.lru_cache(maxsize=1)
+def _env_llm_settings() -> SimpleNamespace:
+    """Resolve the API env vars once per process (raises, uncached, if no key is set).
 
-    class Toolkit:  # type: ignore
-        def register_tool_function(self, *a, **k):
-            pass
+    base_url/model are None when no env override exists; callers fall back to config.
+    """
+    api_key = (
+        os.getenv("OPENAI_API_KEY")
+        or os.getenv("API_KEY")
+        or os.getenv("MOONSHOT_API_KEY")
+        or ""
+    ).strip()
+    if not api_key:
+        raise RuntimeError(
+            "No API key found. Please set one of OPENAI_API_KEY, API_KEY, or MOONSHOT_API_KEY."
+        )
+    return SimpleNamespace(
+        api_key=api_key,
+        base_url=(
+            os.getenv("OPENAI_BASE_URL") or os.getenv("BASE_URL") or os.getenv("KIMI_BASE_URL")
+        ),
+        model=os.getenv("OPENAI_MODEL") or os.getenv("MODEL") or os.getenv("KIMI_MODEL"),
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _bounded_memory_cls() -> type:
+    base = _llm_runtime().InMemoryMemory
+
+    class BoundedMemory(base):  # type: ignore[misc, valid-type]
+        """InMemoryMemory that keeps only the newest `max_msgs` messages."""
+
+        def __init__(self, max_msgs: int) -> None:
+            super().__init__()
+            self.max_msgs = max(1, int(max_msgs))
+
+        async def add(self, *args: Any, **kwargs: Any) -> None:
+            await super().add(*args, **kwargs)
+            content = getattr(self, "content", None)
+            if isinstance(content, list) and len(content) > self.max_msgs:
+                del content[: len(content) - self.max_msgs]
+
+    return BoundedMemory
 
 
 def _join_lines(tpl):
@@ -339,6 +494,161 @@ def _join_lines(tpl):
     return tpl
 
 
+# One chat model (and therefore one underlying HTTP client / connection pool)
+# per distinct endpoint configuration. Ephemeral agents are rebuilt every turn,
+# so constructing a fresh OpenAIChatModel each time would redo client setup and
+# lose keep-alive connections to the same host.
+_SHARED_MODELS: Dict[Tuple[Any, ...], Any] = {}
+
+_HTTP_LIMIT_KEYS = ("max_connections", "max_keepalive_connections", "keepalive_expiry")
+
+
+def _client_args(base_url: str, http_opts: Mapping[str, Any]) -> Dict[str, Any]:
+    """OpenAI client kwargs from the optional `npc.http` config block.
+
+    timeout/max_retries map onto the client directly; connection-pool limits need
+    an explicit httpx client (owned by the model, closed by close_shared_models).
+    """
+    args: Dict[str, Any] = {"base_url": base_url}
+    if http_opts.get("timeout") is not None:
+        args["timeout"] = float(http_opts["timeout"])
+    if http_opts.get("max_retries") is not None:
+        args["max_retries"] = int(http_opts["max_retries"])
+    limits = {k: http_opts[k] for k in _HTTP_LIMIT_KEYS if http_opts.get(k) is not None}
+    if limits:
+        import httpx  # type: ignore  # dependency of the openai SDK
+
+        try:  # keeps the SDK's default timeouts/redirect handling
+            from openai import DefaultAsyncHttpxClient as client_cls  # type: ignore
+        except Exception:
+            client_cls = httpx.AsyncClient
+        args["http_client"] = client_cls(limits=httpx.Limits(**limits))
+    return args
+
+
+def _shared_chat_model(
+    *,
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    stream: bool,
+    temperature: float,
+    extra_body: Optional[Mapping[str, Any]] = None,
+    http: Optional[Mapping[str, Any]] = None,
+) -> OpenAIChatModel:
+    extra = dict(extra_body or {})
+    http_opts = dict(http or {})
+    key = (
+        model_name,
+        api_key,
+        base_url,
+        stream,
+        temperature,
+        json.dumps(extra, sort_keys=True, ensure_ascii=False),
+        json.dumps(http_opts, sort_keys=True),
+    )
+    model = _SHARED_MODELS.get(key)
+    if model is None:
+        generate_kwargs: Dict[str, Any] = {"temperature": temperature}
+        if extra:
+            # provider-specific request fields (e.g. prompt-cache hints)
+            generate_kwargs["extra_body"] = extra
+        model = _llm_runtime().OpenAIChatModel(
+            model_name=model_name,
+            api_key=api_key,
+            stream=stream,
+            client_args=_client_args(base_url, http_opts),
+            generate_kwargs=generate_kwargs,
+        )
+        _SHARED_MODELS[key] = model
+    return model
+
+
+# (loop, {limit: semaphore}) for the loop currently running games; a new loop
+# (e.g. a later asyncio.run in the same process) replaces it.
+_LLM_SLOTS: Optional[
+    Tuple[asyncio.AbstractEventLoop, Dict[int, asyncio.Semaphore]]
+] = None
+
+
+def _llm_slots(model_cfg: Mapping[str, Any]) -> asyncio.Semaphore:
+    """Semaphore bounding concurrent completions on the running loop.
+
+    One semaphore per (loop, max_concurrency): sessions configured with the same
+    limit share a pool, a session with a different limit gets its own.
+    """
+    global _LLM_SLOTS
+    limit = LLM_MAX_CONCURRENCY
+    try:
+        limit = int((model_cfg.get("npc") or {}).get("max_concurrency") or limit)
+    except Exception:
+        pass
+    limit = max(1, limit)
+    loop = asyncio.get_running_loop()
+    if _LLM_SLOTS is None or _LLM_SLOTS[0] is not loop:
+        _LLM_SLOTS = (loop, {})
+    pools = _LLM_SLOTS[1]
+    sem = pools.get(limit)
+    if sem is None:
+        sem = pools[limit] = asyncio.Semaphore(limit)
+    return sem
+
+
+# Tool registration introspects every function (signature + docstring -> JSON
+# schema). A registered template toolkit is kept per tool list and each agent
+# gets a shallow clone: ReActAgent registers its own bound finish function into
+# the toolkit it receives, so a single instance cannot be shared outright.
+_TOOLKIT_TEMPLATES: Dict[Tuple[object, ...], Any] = {}
+_TOOLKIT_TEMPLATES_MAX = 4
+
+
+def _new_toolkit(tools: Tuple[object, ...]) -> Any:
+    toolkit = _llm_runtime().Toolkit()
+    for fn in tools:
+        try:
+            toolkit.register_tool_function(fn)  # type: ignore[arg-type]
+        except Exception:
+            continue
+    return toolkit
+
+
+def _toolkit_for(tools: Optional[List[object]]) -> Any:
+    key = tuple(tools or ())
+    template = _TOOLKIT_TEMPLATES.get(key)
+    if template is None:
+        template = _new_toolkit(key)
+        if len(_TOOLKIT_TEMPLATES) >= _TOOLKIT_TEMPLATES_MAX:
+            _TOOLKIT_TEMPLATES.pop(next(iter(_TOOLKIT_TEMPLATES)))
+        _TOOLKIT_TEMPLATES[key] = template
+    registry = getattr(template, "tools", None)
+    if not isinstance(registry, dict):
+        # Unknown Toolkit layout: cloning is not safe, register from scratch
+        return _new_toolkit(key)
+    toolkit = copy.copy(template)
+    toolkit.tools = dict(registry)
+    groups = getattr(template, "groups", None)
+    if isinstance(groups, dict):
+        toolkit.groups = dict(groups)
+    return toolkit
+
+
+async def close_shared_models() -> None:
+    """Close HTTP clients held by shared chat models (once) and drop the cache."""
+    models = list(_SHARED_MODELS.values())
+    _SHARED_MODELS.clear()
+    for model in models:
+        client = getattr(model, "client", None)
+        closer = getattr(client, "close", None)
+        if not callable(closer):
+            continue
+        try:
+            res = closer()
+            if asyncio.iscoroutine(res):
+                await res
+        except Exception:
+            pass
+
+
 def make_kimi_npc(
     name: str,
     persona: str,
@@ -361,104 +671,51 @@ def make_kimi_npc(
       - Base URL: OPENAI_BASE_URL, BASE_URL, KIMI_BASE_URL
       - Model: OPENAI_MODEL, MODEL, KIMI_MODEL
     """
-    api_key = (
-        os.getenv("OPENAI_API_KEY")
-        or os.getenv("API_KEY")
-        or os.getenv("MOONSHOT_API_KEY")
-        or ""
-    ).strip()
-    if not api_key:
-        raise RuntimeError(
-            "No API key found. Please set one of OPENAI_API_KEY, API_KEY, or MOONSHOT_API_KEY."
-        )
+    env = _env_llm_settings()
+    api_key = env.api_key
     sec = dict(model_cfg.get("npc") or {})
-    base_url = str(
-        os.getenv("OPENAI_BASE_URL")
-        or os.getenv("BASE_URL")
-        or os.getenv("KIMI_BASE_URL")
-        or model_cfg.get("base_url")
-        or "https://api.moonshot.cn/v1"
-    )
-    model_name = (
-        os.getenv("OPENAI_MODEL")
-        or os.getenv("MODEL")
-        or os.getenv("KIMI_MODEL")
-        or sec.get("model")
-        or "kimi-k2-turbo-preview"
-    )
+    base_url = str(env.base_url or model_cfg.get("base_url") or "https://api.moonshot.cn/v1")
+    model_name = env.model or sec.get("model") or "kimi-k2-turbo-preview"
 
     tools_text = DEFAULT_TOOLS_TEXT
     tpl = _join_lines(prompt_template)
 
-    appearance_text = (
-        (appearance or "外观描写未提供，可根据设定自行补充细节。").strip()
-        if isinstance(appearance, str)
-        else "外观描写未提供，可根据设定自行补充细节。"
-    )
-    if isinstance(quotes, (list, tuple)):
-        quote_items = [str(q).strip() for q in quotes if str(q).strip()]
-        quotes_text = " / ".join(quote_items)
-    elif isinstance(quotes, str):
-        quotes_text = quotes.strip() or "保持原角色语气自行发挥。"
-    else:
-        quotes_text = "保持原角色语气自行发挥。"
-    relation_text = (
-        relation_brief or "暂无明确关系记录，默认保持谨慎中立。"
-    ).strip() or "暂无明确关系记录，默认保持谨慎中立。"
-
-    format_args = {
-        "name": name,
-        "persona": persona,
-        "appearance": appearance_text,
-        "quotes": quotes_text,
-        "relation_brief": relation_text,
-        "weapon_brief": (weapon_brief or "无"),
-        "tools": tools_text,
-        "allowed_names": allowed_names or "Doctor, Amiya",
-    }
-
     if sys_prompt is None or not str(sys_prompt).strip():
         # Build using unified system prompt function (consistent with ephemeral agents)
-        try:
-            sys_prompt = build_sys_prompt(
-                name=name,
-                persona=persona,
-                appearance=appearance,
-                quotes=quotes,
-                relation_brief=relation_brief,
-                weapon_brief=weapon_brief,
-                arts_brief=arts_brief,
-                allowed_names=(allowed_names or "Doctor, Amiya"),
-                prompt_template=(tpl if tpl else None),
-                tools_text=tools_text,
-            )
-        except Exception as e:
-            # no fallback: make the failure explicit
-            raise
+        # no fallback: formatting errors propagate
+        sys_prompt = build_sys_prompt(
+            name=name,
+            persona=persona,
+            appearance=appearance,
+            quotes=quotes,
+            relation_brief=relation_brief,
+            weapon_brief=weapon_brief,
+            arts_brief=arts_brief,
+            allowed_names=(allowed_names or "Doctor, Amiya"),
+            prompt_template=(tpl if tpl else None),
+            tools_text=tools_text,
+        )
 
-    # Construct model (requires agentscope installed at runtime)
-    model = OpenAIChatModel(
+    # Construct (or reuse) the model (requires agentscope installed at runtime)
+    model = _shared_chat_model(
         model_name=model_name,
         api_key=api_key,
+        base_url=base_url,
         stream=bool(sec.get("stream", True)),
-        client_args={"base_url": base_url},
-        generate_kwargs={"temperature": float(sec.get("temperature", 0.7))},
+        temperature=float(sec.get("temperature", 0.7)),
+        extra_body=(sec.get("extra_body") if isinstance(sec.get("extra_body"), dict) else None),
+        http=(sec.get("http") if isinstance(sec.get("http"), dict) else None),
     )
 
-    toolkit = Toolkit()
-    if tools:
-        for fn in tools:
-            try:
-                toolkit.register_tool_function(fn)  # type: ignore[arg-type]
-            except Exception:
-                continue
+    rt = _llm_runtime()
+    toolkit = _toolkit_for(tools)
 
-    return ReActAgent(
+    return rt.ReActAgent(
         name=name,
         sys_prompt=sys_prompt,
         model=model,
-        formatter=OpenAIChatFormatter(),
-        memory=InMemoryMemory(),
+        formatter=rt.OpenAIChatFormatter(),
+        memory=_bounded_memory_cls()(CTX_AGENT_MEMORY_MAX_MSGS),
         toolkit=toolkit,
     )
 
@@ -744,6 +1001,10 @@ class Event:
     timestamp: Optional[datetime] = None
     sequence: Optional[int] = None
     correlation_id: Optional[str] = None
+    # Serialised form shared by every subscriber (filled lazily by to_dict)
+    _payload: Optional[Dict[str, Any]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def __post_init__(self) -> None:
         if not isinstance(self.event_type, EventType):
@@ -765,6 +1026,7 @@ class Event:
     def assign_runtime_fields(self, sequence: int, timestamp: datetime) -> None:
         self.sequence = sequence
         self.timestamp = timestamp
+        self._payload = None
 
     def validate(self) -> None:
         # Validation: most event types require specific fields; state_update allows
@@ -797,6 +1059,9 @@ class Event:
                 )
 
     def to_dict(self) -> Dict[str, Any]:
+        """Serialise the event; computed once and shared by all callers (read-only)."""
+        if self._payload is not None:
+            return self._payload
         if self.timestamp is None or self.sequence is None:
             raise RuntimeError(
                 "Event must be normalised by EventBus before serialisation"
@@ -819,6 +1084,7 @@ class Event:
             payload["correlation_id"] = self.correlation_id
         for k, v in self.data.items():
             payload[k] = v
+        self._payload = payload
         return payload
 
 
@@ -872,36 +1138,125 @@ class EventBus:
         self._handlers.clear()
 
 
-class StructuredLogger:
-    """Write structured events to a JSON Lines file."""
+class _BufferedLineWriter:
+    """Shared batching for the log files: lines are buffered and written once
+    the buffer holds FLUSH_LINES entries, when FLUSH_INTERVAL_SEC has elapsed
+    since the last write, or on flush()/close().
+
+    Open writers are also drained by a background thread once their interval
+    has passed (so an idle server does not sit on lines) and at interpreter exit.
+    """
+
+    FLUSH_LINES = 32
+    FLUSH_INTERVAL_SEC = 0.5
 
     def __init__(self, path: Path) -> None:
         self._path = path
         self._lock = Lock()
         self._file = self._prepare_file(path)
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        _track_writer(self)
 
     @staticmethod
     def _prepare_file(path: Path):
         path.parent.mkdir(parents=True, exist_ok=True)
         return path.open("w", encoding="utf-8")
 
-    def handle(self, event: Event) -> None:
-        record = json.dumps(event.to_dict(), ensure_ascii=False)
-        with self._lock:
-            self._file.write(record + "\n")
+    def _append(self, line: str) -> None:
+        # Caller must hold self._lock
+        self._buffer.append(line)
+        if (
+            len(self._buffer) >= self.FLUSH_LINES
+            or time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL_SEC
+        ):
+            self._drain()
+
+    def _drain(self) -> None:
+        # Caller must hold self._lock
+        if self._buffer and not self._file.closed:
+            self._file.writelines(self._buffer)
             self._file.flush()
+        self._buffer.clear()
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._drain()
+
+    def flush_if_due(self) -> None:
+        """Drain pending lines once FLUSH_INTERVAL_SEC has passed since the last write."""
+        with self._lock:
+            if self._buffer and time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL_SEC:
+                self._drain()
 
     def close(self) -> None:
         with self._lock:
+            self._drain()
             if not self._file.closed:
                 self._file.close()
+        _untrack_writer(self)
 
     @property
     def path(self) -> Path:
         return self._path
 
 
-class StoryLogger:
+# Writers that are still open; weak so an unclosed, dropped writer is not kept alive
+_LIVE_WRITERS: "weakref.WeakSet[_BufferedLineWriter]" = weakref.WeakSet()
+_LIVE_WRITERS_LOCK = Lock()
+_FLUSHER: Optional[Thread] = None
+
+
+def _track_writer(writer: _BufferedLineWriter) -> None:
+    global _FLUSHER
+    with _LIVE_WRITERS_LOCK:
+        _LIVE_WRITERS.add(writer)
+        if _FLUSHER is None:
+            _FLUSHER = Thread(target=_flusher_loop, name="log-flusher", daemon=True)
+            _FLUSHER.start()
+
+
+def _untrack_writer(writer: _BufferedLineWriter) -> None:
+    with _LIVE_WRITERS_LOCK:
+        _LIVE_WRITERS.discard(writer)
+
+
+def _live_writers() -> List[_BufferedLineWriter]:
+    with _LIVE_WRITERS_LOCK:
+        return list(_LIVE_WRITERS)
+
+
+def _flusher_loop() -> None:
+    while True:
+        time.sleep(_BufferedLineWriter.FLUSH_INTERVAL_SEC)
+        for writer in _live_writers():
+            try:
+                writer.flush_if_due()
+            except Exception:
+                pass
+
+
+@atexit.register
+def _flush_live_writers() -> None:
+    """Write out whatever is still buffered (interpreter exit)."""
+    for writer in _live_writers():
+        try:
+            writer.flush()
+        except Exception:
+            pass
+
+
+class StructuredLogger(_BufferedLineWriter):
+    """Write structured events to a JSON Lines file (batched; see _BufferedLineWriter)."""
+
+    def handle(self, event: Event) -> None:
+        record = _json_dumps(event.to_dict())
+        with self._lock:
+            self._append(record + "\n")
+
+
+class StoryLogger(_BufferedLineWriter):
     """Persist human-readable narrative lines extracted from events.
 
     This logger is intentionally opinionated: it keeps the core story flow
@@ -910,19 +1265,18 @@ class StoryLogger:
     in the human-readable story log. Structured logs remain full-fidelity.
     """
 
+    # Identical (actor, text) lines seen within this many recent entries are
+    # dropped; models occasionally regurgitate the same line verbatim.
+    DEDUP_WINDOW = 16
+
     def __init__(self, path: Path) -> None:
-        self._path = path
-        self._lock = Lock()
-        self._file = self._prepare_file(path)
+        super().__init__(path)
+        self._recent: deque[Tuple[str, str]] = deque()
+        self._recent_set: set[Tuple[str, str]] = set()
         # Keep only the first world-summary (opening background); subsequent
         # summaries are repetitive for human readers.
         self._printed_initial_world_summary = False
 
-    @staticmethod
-    def _prepare_file(path: Path):
-        path.parent.mkdir(parents=True, exist_ok=True)
-        return path.open("w", encoding="utf-8")
-
     def handle(self, event: Event) -> None:
         # Only record human-facing narrative lines
         if event.event_type is not EventType.NARRATIVE:
@@ -946,18 +1300,15 @@ class StoryLogger:
         actor = event.actor or "system"
         timestamp = event.timestamp.isoformat() if event.timestamp else ""
         line = f"[{event.event_id}] {timestamp} {actor}: {text}"
+        key = (str(actor), str(text))
         with self._lock:
-            self._file.write(line + "\n")
-            self._file.flush()
-
-    def close(self) -> None:
-        with self._lock:
-            if not self._file.closed:
-                self._file.close()
-
-    @property
-    def path(self) -> Path:
-        return self._path
+            if key in self._recent_set:
+                return
+            self._recent.append(key)
+            self._recent_set.add(key)
+            if len(self._recent) > self.DEDUP_WINDOW:
+                self._recent_set.discard(self._recent.popleft())
+            self._append(line + "\n")
 
 
 @dataclass
@@ -1036,22 +1387,52 @@ class _WorldPort:
     set_participants = staticmethod(world_impl.set_participants)
     set_character_meta = staticmethod(world_impl.set_character_meta)
 
-    @staticmethod
-    def snapshot() -> Dict[str, Any]:
-        return world_impl.WORLD.snapshot()
+    # Last snapshot and the (world identity, version) it was built for. A turn
+    # reads the snapshot many times between mutations; rebuild only on change.
+    # snapshot()/runtime() hand every caller the same cached dict, so callers
+    # must not mutate it (copy first): a write would be served to everyone until
+    # the next version bump. Plain dicts are kept on purpose, since the snapshot
+    # is emitted in state_update events and serialised as JSON.
+    _snapshot_key: Optional[Tuple[int, int]] = None
+    _snapshot_cache: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def snapshot(cls) -> Dict[str, Any]:
+        """Return the current world snapshot (cached and shared: do not mutate)."""
+        W = world_impl.WORLD
+        key = (id(W), int(getattr(W, "version", 0)))
+        if cls._snapshot_cache is None or cls._snapshot_key != key:
+            cls._snapshot_cache = W.snapshot()
+            cls._snapshot_key = key
+        return cls._snapshot_cache
+
+    _runtime_key: Optional[Tuple[int, int]] = None
+    _runtime_cache: Optional[Dict[str, Any]] = None
 
     @staticmethod
-    def runtime() -> Dict[str, Any]:
+    def character(name: str) -> Mapping[str, Any]:
+        """One actor's live sheet (read-only; empty when unknown) without a snapshot."""
+        return world_impl.WORLD.characters.get(str(name)) or {}
+
+    @classmethod
+    def runtime(cls) -> Dict[str, Any]:
+        """Cheap runtime view (positions, combat, turn state); cached and shared like
+        snapshot(), so do not mutate it either."""
         W = world_impl.WORLD
-        return {
-            "version": int(getattr(W, "version", 0)),
-            "positions": dict(W.positions),
-            "in_combat": bool(W.in_combat),
-            "turn_state": dict(W.turn_state),
-            "round": int(W.round),
-            "characters": dict(W.characters),
-            "participants": list(getattr(W, "participants", []) or []),
-        }
+        version = int(getattr(W, "version", 0))
+        key = (id(W), version)
+        if cls._runtime_cache is None or cls._runtime_key != key:
+            cls._runtime_cache = {
+                "version": version,
+                "positions": dict(W.positions),
+                "in_combat": bool(W.in_combat),
+                "turn_state": dict(W.turn_state),
+                "round": int(W.round),
+                "characters": dict(W.characters),
+                "participants": list(getattr(W, "participants", []) or []),
+            }
+            cls._runtime_key = key
+        return cls._runtime_cache
 
 
 # Note: DnD compatibility and conversion paths removed; CoC-only runtime.
@@ -1061,6 +1442,22 @@ class _WorldPort:
 # Module-level Constants
 # ============================================================
 
+# Mid-line CoC characteristics for actors whose config has no `coc` block
+# (set_coc_character copies the values, so one shared mapping is enough)
+DEFAULT_COC_CHARACTERISTICS: Mapping[str, int] = MappingProxyType(
+    {
+        "STR": 50,
+        "DEX": 50,
+        "CON": 50,
+        "INT": 50,
+        "POW": 50,
+        "APP": 50,
+        "EDU": 60,
+        "SIZ": 50,
+        "LUCK": 50,
+    }
+)
+
 # Relation thresholds for categorization
 RELATION_INTIMATE_FRIEND = 60
 RELATION_CLOSE_ALLY = 40
@@ -1094,7 +1491,7 @@ def build_sys_prompt(
         appearance or "外观描写未提供，可根据设定自行补充细节。"
     ).strip() or "外观描写未提供，可根据设定自行补充细节。"
     if isinstance(quotes, (list, tuple)):
-        items = [str(q).strip() for q in quotes if str(q).strip()]
+        items = [t for q in quotes if (t := str(q).strip())]
         quotes_text = " / ".join(items) if items else "保持原角色语气自行发挥。"
     elif isinstance(quotes, str):
         quotes_text = quotes.strip() or "保持原角色语气自行发挥。"
@@ -1121,25 +1518,35 @@ def build_sys_prompt(
     tpl = None
     if prompt_template is not None:
         try:
-            if isinstance(prompt_template, list):
-                tpl = "\\n".join(str(x) for x in prompt_template)
-            else:
-                tpl = str(prompt_template)
+            tpl = str(_join_lines(prompt_template))
         except Exception:
             tpl = None
     if tpl is None:
         tpl = DEFAULT_PROMPT_TEMPLATE
 
+    # no fallback: format errors propagate (and are not cached)
     try:
-        return str(tpl.format(**args))
-    except Exception as e:
-        # no fallback: propagate
-        raise
+        return _format_sys_prompt(tpl, tuple(args.items()))
+    except TypeError:
+        # unhashable argument (e.g. a list/dict persona from characters.json): format uncached
+        return str(tpl.format_map(args))
+
+
+@functools.lru_cache(maxsize=64)
+def _format_sys_prompt(tpl: str, args: Tuple[Tuple[str, Any], ...]) -> str:
+    # Rebuilt for every actor turn, but identical until a brief/relation changes
+    return str(tpl.format_map(dict(args)))
 
 
 # Tool call pattern
 TOOL_CALL_PATTERN = re.compile(r"CALL_TOOL\s+(?P<name>[A-Za-z_][A-Za-z0-9_]*)")
 
+# "理由/reason:" trailers that tools append to their result text
+_REASON_TAIL_RE = re.compile(r"\s*(?:行动)?(?:理由|reason|Reason)[:：][\s\S]*$")
+_REASON_HEAD_RE = re.compile(r"^(?:行动)?(?:理由|reason|Reason)[:：]")
+_SCENE_TIME_RE = re.compile(r"^(\d{1,2}):(\d{2})$")
+_WEAPON_DAMAGE_RE = re.compile(r"\d*d\d+(?:[+-]\d+)?")
+
 
 # ============================================================
 # Utility Functions
@@ -1165,15 +1572,19 @@ def _relation_category(score: int) -> str:
 
 def _safe_text(msg: Msg) -> str:
     """Extract text content from a Msg object, handling various content formats."""
-    try:
-        text = msg.get_text_content()
-    except Exception:
-        text = None
-    if text is not None:
-        return str(text)
     content = getattr(msg, "content", None)
     if isinstance(content, str):
+        # the common case; get_text_content() would return the same string
         return content
+    # Probe instead of catching AttributeError: plain/stub messages lack the method
+    getter = getattr(msg, "get_text_content", None)
+    if callable(getter):
+        try:
+            text = getter()
+        except Exception:
+            text = None
+        if text is not None:
+            return str(text)
     if isinstance(content, list):
         lines = []
         for blk in content:
@@ -1250,7 +1661,7 @@ def _parse_tool_calls(text: str) -> List[Tuple[str, dict]]:
         params: dict = {}
         if json_body:
             try:
-                params = json.loads(json_body)
+                params = _json_loads(json_body)
             except Exception:
                 params = {}
             calls.append((name, params))
@@ -1294,6 +1705,33 @@ def _parse_story_positions(raw: Any, target: Dict[str, Tuple[int, int]]) -> None
                 continue
 
 
+def _collect_story_positions(story_cfg: Any) -> Dict[str, Tuple[int, int]]:
+    """Merge initial_positions / positions / initial.positions (later wins)."""
+    positions: Dict[str, Tuple[int, int]] = {}
+    if not isinstance(story_cfg, Mapping):
+        return positions
+    _parse_story_positions(story_cfg.get("initial_positions") or {}, positions)
+    _parse_story_positions(story_cfg.get("positions") or {}, positions)
+    initial_section = story_cfg.get("initial")
+    if isinstance(initial_section, Mapping):
+        _parse_story_positions(initial_section.get("positions") or {}, positions)
+    return positions
+
+
+def _apply_story_positions(world: Any, positions: Dict[str, Tuple[int, int]]) -> None:
+    """Place actors and set them as participants; per-actor failures are ignored."""
+    for nm, (x, y) in positions.items():
+        try:
+            world.set_position(nm, x, y)
+        except Exception:
+            pass
+    if positions:
+        try:
+            world.set_participants(list(positions.keys()))
+        except Exception:
+            pass
+
+
 @dataclass
 class TurnContext:
     world: Any
@@ -1301,7 +1739,7 @@ class TurnContext:
     tool_dispatch: Dict[str, object]
     tool_list: List[object]
     chat_log: List[Dict[str, Any]]
-    action_log: List[Dict[str, Any]]
+    action_log: deque[Dict[str, Any]]
     last_seen: Dict[str, int]
     current_round: int
     recap_enabled: bool
@@ -1312,6 +1750,13 @@ class TurnContext:
     model_cfg: Mapping[str, Any]
     build_agent: Callable[..., ReActAgent]
     debug_dump_prompts: bool = False
+    # Player-controlled actors and their latest non-empty line (kept by bcast)
+    player_names: frozenset[str] = frozenset()
+    last_player_line: Optional[Tuple[str, str]] = None
+    # World version carried by the last full state_update (see emit_world_state)
+    last_world_state_version: Optional[int] = None
+    # Text of the last world summary broadcast to observers (phase context:world)
+    last_world_summary: Optional[str] = None
 
 
 def relation_brief_for(world: Any, name: str) -> str:
@@ -1347,8 +1792,8 @@ def weapon_brief_for(world: Any, nm: str) -> str:
     except Exception:
         return "无"
     entries: List[str] = []
-    for wid, count in bag.items():
-        if int(count) <= 0 or wid not in wdefs:
+    for wid, qty in bag.items():
+        if int(qty) <= 0 or wid not in wdefs:
             continue
         try:
             reach = int((wdefs[wid] or {}).get("reach_steps", 1))
@@ -1412,6 +1857,18 @@ def apply_story_position(
         pass
 
 
+def init_coc_sheet(world: Any, name: str, entry: Mapping[str, Any]) -> None:
+    """Create the actor's CoC sheet from its `coc` config block, or mid-line defaults."""
+    try:
+        coc_block = entry.get("coc")
+        if isinstance(coc_block, dict):
+            world.set_coc_character_from_config(name=name, coc=coc_block or {})
+        else:
+            world.set_coc_character(name=name, characteristics=DEFAULT_COC_CHARACTERISTICS)
+    except Exception:
+        pass
+
+
 def normalize_scene_cfg(sc: Optional[Mapping[str, Any]]):
     name = None
     objectives: List[str] = []
@@ -1436,7 +1893,7 @@ def normalize_scene_cfg(sc: Optional[Mapping[str, Any]]):
                     details.append(d.strip())
         tstr = sc.get("time")
         if isinstance(tstr, str) and tstr:
-            m = re.match(r"^(\d{1,2}):(\d{2})$", tstr.strip())
+            m = _SCENE_TIME_RE.match(tstr.strip())
             if m:
                 hh, mm = int(m.group(1)), int(m.group(2))
                 if 0 <= hh < 24 and 0 <= mm < 60:
@@ -1493,6 +1950,9 @@ async def bcast(
         )
     except Exception:
         pass
+    actor = getattr(msg, "name", None)
+    if actor in ctx.player_names and text and text.strip():
+        ctx.last_player_line = (str(actor), text.strip())
 
 
 def emit_turn_state(ctx: TurnContext) -> None:
@@ -1523,6 +1983,13 @@ def emit_turn_state(ctx: TurnContext) -> None:
 
 def emit_world_state(ctx: TurnContext, turn_val: int) -> None:
     snapshot = ctx.world.snapshot()
+    # Skip the full snapshot when the world has not changed since the last one;
+    # observers already hold that state (turn-state deltas are emitted separately).
+    version = snapshot.get("version")
+    if isinstance(version, int):
+        if version == ctx.last_world_state_version:
+            return
+        ctx.last_world_state_version = version
     ctx.emit("state_update", phase="world", turn=turn_val, data={"state": snapshot})
 
 
@@ -1661,7 +2128,7 @@ def make_ephemeral_agent(
     ctx: TurnContext, name: str, private_section: Optional[str]
 ) -> ReActAgent:
     try:
-        sheet_now = (ctx.world.snapshot().get("characters") or {}).get(name, {}) or {}
+        sheet_now = ctx.world.character(name)
         persona_now = sheet_now.get("persona") or ""
         appearance_now = sheet_now.get("appearance")
         quotes_now = sheet_now.get("quotes")
@@ -1670,15 +2137,20 @@ def make_ephemeral_agent(
         appearance_now = None
         quotes_now = None
 
+    # Briefs are shared by the system prompt and the agent factory: compute once
+    relation_brief = relation_brief_for(ctx.world, name)
+    weapon_brief = weapon_brief_for(ctx.world, name)
+    arts_brief = arts_brief_for(ctx.world, name)
+
     # Build system prompt (outside the try/except so it always runs)
     sys_prompt_text = build_sys_prompt(
         name=name,
         persona=str(persona_now or ""),
         appearance=appearance_now,
         quotes=quotes_now,
-        relation_brief=relation_brief_for(ctx.world, name),
-        weapon_brief=weapon_brief_for(ctx.world, name),
-        arts_brief=arts_brief_for(ctx.world, name),
+        relation_brief=relation_brief,
+        weapon_brief=weapon_brief,
+        arts_brief=arts_brief,
         allowed_names=ctx.allowed_names_str,
     )
     if CTX_PRIVATE_SECTION_MODE == "system" and private_section:
@@ -1691,9 +2163,9 @@ def make_ephemeral_agent(
         allowed_names=ctx.allowed_names_str,
         appearance=appearance_now,
         quotes=quotes_now,
-        relation_brief=relation_brief_for(ctx.world, name),
-        weapon_brief=weapon_brief_for(ctx.world, name),
-        arts_brief=arts_brief_for(ctx.world, name),
+        relation_brief=relation_brief,
+        weapon_brief=weapon_brief,
+        arts_brief=arts_brief,
         tools=ctx.tool_list,
     )
     try:
@@ -1703,8 +2175,41 @@ def make_ephemeral_agent(
     return agent
 
 
-async def handle_tool_calls(ctx: TurnContext, origin: Msg, hub: MsgHub):
-    text = _safe_text(origin)
+def _strip_reason(t: str) -> str:
+    s = str(t or "")
+    s = _REASON_TAIL_RE.sub("", s).strip()
+    if _REASON_HEAD_RE.match(s):
+        return ""
+    return s
+
+
+def _tool_result_lines(resp: Any) -> List[str]:
+    """Text lines of a tool response, reason trailers stripped, blanks dropped (one pass)."""
+    blocks = getattr(resp, "content", None)
+    if not isinstance(blocks, list):
+        return []
+    lines: List[str] = []
+    for blk in blocks:
+        if hasattr(blk, "text"):
+            raw = getattr(blk, "text", "")
+        elif isinstance(blk, dict):
+            raw = blk.get("text", "")
+        else:
+            raw = blk
+        try:
+            text = _strip_reason(str(raw))
+        except Exception:
+            text = str(raw)
+        if text:
+            lines.append(text)
+    return lines
+
+
+async def handle_tool_calls(
+    ctx: TurnContext, origin: Msg, hub: MsgHub, text: Optional[str] = None
+):
+    if text is None:
+        text = _safe_text(origin)
     tool_calls = _parse_tool_calls(text)
     if not tool_calls:
         return
@@ -1845,31 +2350,8 @@ async def handle_tool_calls(ctx: TurnContext, origin: Msg, hub: MsgHub):
                 },
             )
             continue
-        text_blocks = getattr(resp, "content", None)
-        lines: List[str] = []
-        if isinstance(text_blocks, list):
-            for blk in text_blocks:
-                if hasattr(blk, "text"):
-                    lines.append(str(getattr(blk, "text", "")))
-                elif isinstance(blk, dict):
-                    lines.append(str(blk.get("text", "")))
-                else:
-                    lines.append(str(blk))
+        lines = _tool_result_lines(resp)
         meta = getattr(resp, "metadata", None)
-        try:
-
-            def _strip_reason(t: str) -> str:
-                s = str(t or "")
-                s = re.sub(
-                    r"\s*(?:行动)?(?:理由|reason|Reason)[:：][\s\S]*$", "", s
-                ).strip()
-                if re.match(r"^(?:行动)?(?:理由|reason|Reason)[:：]", s):
-                    return ""
-                return s
-
-            lines = [x for x in (_strip_reason(x) for x in lines) if x]
-        except Exception:
-            pass
         ctx.emit(
             "tool_result",
             actor=origin.name,
@@ -1893,7 +2375,7 @@ async def handle_tool_calls(ctx: TurnContext, origin: Msg, hub: MsgHub):
             continue
         tool_msg = Msg(
             name=f"{origin.name}[tool]",
-            content="\n".join(line for line in lines if line),
+            content="\n".join(lines),
             role="assistant",
         )
         await bcast(ctx, hub, tool_msg, phase=phase)
@@ -1903,11 +2385,18 @@ def recap_for(ctx: TurnContext, name: str) -> Optional[Msg]:
     if not ctx.recap_enabled:
         return None
     start = int(ctx.last_seen.get(name, 0))
-    recent_msgs = [
-        e for e in ctx.chat_log[start:] if e.get("actor") not in (None, "Host")
-    ]
-    if ctx.recap_msg_limit > 0:
-        recent_msgs = recent_msgs[-ctx.recap_msg_limit :]
+    # Walk backwards from the newest entry so only the last `limit` matches are
+    # touched, instead of copying the whole unseen tail of the chat log.
+    limit = ctx.recap_msg_limit
+    recent_msgs: List[Dict[str, Any]] = []
+    for i in range(len(ctx.chat_log) - 1, start - 1, -1):
+        e = ctx.chat_log[i]
+        if e.get("actor") in (None, "Host"):
+            continue
+        recent_msgs.append(e)
+        if 0 < limit <= len(recent_msgs):
+            break
+    recent_msgs.reverse()
     if not recent_msgs:
         return None
     lines: List[str] = [RECAP_TITLE.format(name=name)]
@@ -1919,6 +2408,57 @@ def recap_for(ctx: TurnContext, name: str) -> Optional[Msg]:
     return Msg("Host", "\n".join(lines), "assistant")
 
 
+# Context injectors, keyed by CTX_INJECTION_ORDER token. Each returns the
+# message to add to the agent's memory plus its label/text for prompt dumps,
+# or None when the block is disabled or empty.
+_Injected = Optional[Tuple[Msg, str, str]]
+
+
+def _inject_env(
+    ctx: TurnContext, name: str, private_section: Optional[str], recap_msg: Optional[Msg]
+) -> _Injected:
+    if not CTX_INJECT_ENV_SUMMARY:
+        return None
+    env_text = _world_summary_text(ctx.world.snapshot())
+    return Msg("Host", env_text, "assistant"), "env", env_text
+
+
+def _inject_recap(
+    ctx: TurnContext, name: str, private_section: Optional[str], recap_msg: Optional[Msg]
+) -> _Injected:
+    if not CTX_INJECT_RECAP or recap_msg is None:
+        return None
+    return recap_msg, "recap", _safe_text(recap_msg)
+
+
+def _inject_reach_preview(
+    ctx: TurnContext, name: str, private_section: Optional[str], recap_msg: Optional[Msg]
+) -> _Injected:
+    if not CTX_INJECT_REACH_PREVIEW:
+        return None
+    lines = reach_preview_lines(ctx.world, name)
+    if not lines:
+        return None
+    text = "\n".join([REACH_RULE_LINE] + lines)
+    return Msg("Host", text, "assistant"), "reach_preview", text
+
+
+def _inject_private(
+    ctx: TurnContext, name: str, private_section: Optional[str], recap_msg: Optional[Msg]
+) -> _Injected:
+    if CTX_PRIVATE_SECTION_MODE != "memory" or not private_section:
+        return None
+    return Msg("Host", private_section, "assistant"), "private", private_section
+
+
+_CTX_INJECTORS: Dict[str, Callable[..., _Injected]] = {
+    "env": _inject_env,
+    "recap": _inject_recap,
+    "reach_preview": _inject_reach_preview,
+    "private": _inject_private,
+}
+
+
 async def npc_ephemeral_say(
     ctx: TurnContext,
     name: str,
@@ -1929,50 +2469,20 @@ async def npc_ephemeral_say(
     ephemeral = make_ephemeral_agent(ctx, name, private_section)
     debug_items: List[Tuple[str, str]] = []
     for token in list(CTX_INJECTION_ORDER or []):
+        build = _CTX_INJECTORS.get(str(token).strip().lower())
+        if build is None:
+            continue
         try:
-            tk = str(token).strip().lower()
-            if tk == "env" and CTX_INJECT_ENV_SUMMARY:
-                try:
-                    env_text = _world_summary_text(ctx.world.snapshot())
-                    await ephemeral.memory.add(Msg("Host", env_text, "assistant"))
-                    debug_items.append(("env", env_text))
-                except Exception:
-                    pass
-            elif tk == "recap" and CTX_INJECT_RECAP:
-                try:
-                    if recap_msg is not None:
-                        await ephemeral.memory.add(recap_msg)
-                        debug_items.append(("recap", _safe_text(recap_msg)))
-                except Exception:
-                    pass
-            elif tk == "reach_preview" and CTX_INJECT_REACH_PREVIEW:
-                try:
-                    lines = reach_preview_lines(ctx.world, name)
-                    if lines:
-                        lines = [REACH_RULE_LINE] + lines
-                        text = "\n".join(lines)
-                        await ephemeral.memory.add(Msg("Host", text, "assistant"))
-                        debug_items.append(("reach_preview", text))
-                except Exception:
-                    pass
-            elif (
-                tk == "private"
-                and CTX_PRIVATE_SECTION_MODE == "memory"
-                and private_section
-            ):
-                try:
-                    await ephemeral.memory.add(
-                        Msg("Host", private_section, "assistant")
-                    )
-                    debug_items.append(("private", private_section))
-                except Exception:
-                    pass
+            item = build(ctx, name, private_section, recap_msg)
+            if item is not None:
+                msg, label, text = item
+                await ephemeral.memory.add(msg)
+                debug_items.append((label, text))
         except Exception:
             pass
     if ctx.debug_dump_prompts:
         try:
-            root = project_root()
-            dump_dir = root / "logs" / "prompts"
+            dump_dir = _prompts_dir()
             dump_dir.mkdir(parents=True, exist_ok=True)
             safe = "".join(
                 ch if ch.isalnum() or ch in ("_", "-", ".") else "_" for ch in str(name)
@@ -2001,7 +2511,12 @@ async def npc_ephemeral_say(
                 f.write("\n".join(lines))
         except Exception:
             pass
-    out = await ephemeral(None)
+    # No retry at this level: the agent may already have run world-mutating tools
+    # when a later model call fails. Transient HTTP failures are retried inside
+    # the OpenAI client itself (npc.http.max_retries), before any tool runs.
+    async with _llm_slots(ctx.model_cfg):
+        out = await ephemeral(None)
+    raw_text: Optional[str] = None
     try:
         raw_text = _safe_text(out)
         cleaned = _strip_tool_calls_from_text(raw_text)
@@ -2016,7 +2531,7 @@ async def npc_ephemeral_say(
             await bcast(ctx, hub, out, phase=f"npc:{name}")
     except Exception:
         await bcast(ctx, hub, out, phase=f"npc:{name}")
-    await handle_tool_calls(ctx, out, hub)
+    await handle_tool_calls(ctx, out, hub, raw_text)
 
 
 async def run_demo(
@@ -2035,18 +2550,7 @@ async def run_demo(
 ) -> None:
     """Run the NPC talk demo (sequential group chat, no GM/adjudication)."""
 
-    story_positions: Dict[str, Tuple[int, int]] = {}
-
-    if isinstance(story_cfg, dict):
-        _parse_story_positions(
-            story_cfg.get("initial_positions") or {}, story_positions
-        )
-        _parse_story_positions(story_cfg.get("positions") or {}, story_positions)
-        initial_section = story_cfg.get("initial")
-        if isinstance(initial_section, dict):
-            _parse_story_positions(
-                initial_section.get("positions") or {}, story_positions
-            )
+    story_positions = _collect_story_positions(story_cfg)
 
     # story position application moved to top-level helper
 
@@ -2144,28 +2648,7 @@ async def run_demo(
         for name in allowed_names_world:
             entry = (char_cfg.get(name) or {}) if isinstance(char_cfg, dict) else {}
             # Stat block: CoC only (DnD compatibility removed).
-            try:
-                coc_block = entry.get("coc")
-                if isinstance(coc_block, dict):
-                    world.set_coc_character_from_config(name=name, coc=coc_block or {})
-                else:
-                    # Create a minimal CoC sheet with mid-line defaults
-                    world.set_coc_character(
-                        name=name,
-                        characteristics={
-                            "STR": 50,
-                            "DEX": 50,
-                            "CON": 50,
-                            "INT": 50,
-                            "POW": 50,
-                            "APP": 50,
-                            "EDU": 60,
-                            "SIZ": 50,
-                            "LUCK": 50,
-                        },
-                    )
-            except Exception:
-                pass
+            init_coc_sheet(world, name, entry)
             apply_story_position(world, story_positions, name)
             # Load inventory (weapons as items) from character config
             try:
@@ -2180,27 +2663,6 @@ async def run_demo(
             except Exception:
                 pass
 
-            # Build per-actor weapon brief for prompt
-            def _weapon_brief_for(nm: str) -> str:
-                try:
-                    snap = world.snapshot()
-                    wdefs = dict((snap.get("weapon_defs") or {}))
-                    bag = dict((snap.get("inventory") or {}).get(str(nm), {}) or {})
-                except Exception:
-                    return "无"
-                entries: List[str] = []
-                for wid, count in bag.items():
-                    if int(count) <= 0 or wid not in wdefs:
-                        continue
-                    wd = wdefs.get(wid) or {}
-                    try:
-                        rs = int(wd.get("reach_steps", 1))
-                    except Exception:
-                        rs = 1
-                    dmg = wd.get("damage", "")
-                    entries.append(f"{wid}(触及 {rs}步, 伤害 {dmg or '?'} )")
-                return "；".join(entries) if entries else "无"
-
             # Read meta from world (single source of truth)
             try:
                 sheet = (world.snapshot().get("characters") or {}).get(name, {}) or {}
@@ -2216,13 +2678,15 @@ async def run_demo(
                 # 不加入 participants_order（Hub 仅管理 NPC Agent 的内存）
                 pass
             else:
+                relation_brief = relation_brief_for(world, name)
+                weapon_brief = weapon_brief_for(world, name)
                 sys_prompt_text = build_sys_prompt(
                     name=name,
                     persona=persona,
                     appearance=appearance,
                     quotes=quotes,
-                    relation_brief=relation_brief_for(world, name),
-                    weapon_brief=weapon_brief_for(world, name),
+                    relation_brief=relation_brief,
+                    weapon_brief=weapon_brief,
                     allowed_names=allowed_names_str,
                 )
                 agent = build_agent(
@@ -2233,8 +2697,8 @@ async def run_demo(
                     allowed_names=allowed_names_str,
                     appearance=appearance,
                     quotes=quotes,
-                    relation_brief=relation_brief_for(world, name),
-                    weapon_brief=weapon_brief_for(world, name),
+                    relation_brief=relation_brief,
+                    weapon_brief=weapon_brief,
                     tools=tool_list,
                 )
                 # 仅 NPC 参与 Hub 和初始化 pipeline
@@ -2244,27 +2708,7 @@ async def run_demo(
         for name, entry in actor_entries.items():
             if name in allowed_names_world:
                 continue
-            try:
-                coc_block = entry.get("coc")
-                if isinstance(coc_block, dict):
-                    world.set_coc_character_from_config(name=name, coc=coc_block or {})
-                else:
-                    world.set_coc_character(
-                        name=name,
-                        characteristics={
-                            "STR": 50,
-                            "DEX": 50,
-                            "CON": 50,
-                            "INT": 50,
-                            "POW": 50,
-                            "APP": 50,
-                            "EDU": 60,
-                            "SIZ": 50,
-                            "LUCK": 50,
-                        },
-                    )
-            except Exception:
-                pass
+            init_coc_sheet(world, name, entry)
             apply_story_position(world, story_positions, name)
     # No fallback to default protagonists; if story provides no positions, run without participants.
 
@@ -2338,8 +2782,8 @@ async def run_demo(
     TOOL_DISPATCH = dict(tool_dispatch or {})
     allowed_set = {str(n) for n in (allowed_names_world or [])}
     CHAT_LOG: List[Dict[str, Any]] = []  # {actor, role, text, turn, phase}
-    ACTION_LOG: List[Dict[str, Any]] = (
-        []
+    ACTION_LOG: deque[Dict[str, Any]] = deque(
+        maxlen=ACTION_LOG_MAX_ENTRIES
     )  # {actor, tool, type, text|params, meta, turn}
     LAST_SEEN: Dict[str, int] = {}  # per-actor chat index checkpoint
     recap_enabled = True
@@ -2363,12 +2807,32 @@ async def run_demo(
         model_cfg=model_cfg,
         build_agent=build_agent,
         debug_dump_prompts=DEBUG_DUMP_PROMPTS,
+        player_names=frozenset(
+            nm for nm, typ in actor_types.items() if str(typ) == "player"
+        ),
     )
 
     # ---- In-memory mini logs for per-turn recap (kept in ctx) ----
 
     # Async CLI input helper (avoid blocking event loop when玩家发言)
+    # Prefer prompt_toolkit on a real TTY so waiting for the player does not
+    # hold a default-executor thread; otherwise read via input() in a thread.
+    prompt_session: List[Any] = []
+
     async def _async_input(prompt: str) -> str:
+        if sys.stdin.isatty():
+            try:
+                if not prompt_session:
+                    # optional dep, imported on first use (slow to import)
+                    from prompt_toolkit import PromptSession  # type: ignore
+
+                    prompt_session.append(PromptSession())
+                return str(await prompt_session[0].prompt_async(prompt))
+            except EOFError:
+                # Ctrl-D: empty line, as with input(); Ctrl-C still ends the run
+                return ""
+            except ImportError:
+                pass
         loop = asyncio.get_running_loop()
         try:
             return await loop.run_in_executor(None, lambda: input(prompt))
@@ -2407,9 +2871,11 @@ async def run_demo(
 
     # Human-readable header for participants and starting positions
     _start_pos_lines = []
+    parts: List[str] = []
     try:
-        parts = list(world.snapshot().get("participants") or [])
-        pos_map = world.snapshot().get("positions") or {}
+        snap = world.snapshot()
+        parts = list(snap.get("participants") or [])
+        pos_map = snap.get("positions") or {}
         for nm in parts:
             pos = pos_map.get(nm) or story_positions.get(nm)
             if pos:
@@ -2418,11 +2884,7 @@ async def run_demo(
         _start_pos_lines = []
     _participants_header = (
         "参与者："
-        + (
-            ", ".join(world.snapshot().get("participants") or [])
-            if (world.snapshot().get("participants") or [])
-            else "(无)"
-        )
+        + (", ".join(parts) if parts else "(无)")
         + (" | 初始坐标：" + "; ".join(_start_pos_lines) if _start_pos_lines else "")
     )
 
@@ -2509,6 +2971,8 @@ async def run_demo(
     ) as hub:
         # 开场：让每个 NPC 先各发一条对白（并可附带工具调用），以便在玩家输入前呈现剧情开端
         try:
+            # 依次生成：开场对白可附带工具调用（移动/攻击等），后续 NPC 的环境概要与
+            # 触及预览都基于前者执行后的世界状态，因此不能并发。
             for name in list(allowed_names_world) or []:
                 if str(actor_types.get(name, "npc")) != "npc":
                     continue
@@ -2538,31 +3002,30 @@ async def run_demo(
         # Default to original semantics: end when no hostiles (fixed behaviour)
         require_hostiles = True
 
-        def _is_alive(nm: str) -> bool:
+        def _is_alive(chars: Mapping[str, Any], nm: str) -> bool:
             try:
-                chars = world.snapshot().get("characters", {}) or {}
                 st = chars.get(str(nm), {})
                 return int(st.get("hp", 1)) > 0
             except Exception:
                 return True
 
-        def _living_field_names() -> List[str]:
+        def _living_field_names(snap: Mapping[str, Any]) -> List[str]:
             # Prefer participants; else those with positions; else all characters
+            chars = snap.get("characters") or {}
             base: List[str]
             if allowed_names_world:
                 base = list(allowed_names_world)
             else:
-                snap = world.snapshot()
-                base = list((snap.get("positions") or {}).keys()) or list(
-                    (snap.get("characters") or {}).keys()
-                )
-            return [n for n in base if _is_alive(n)]
+                base = list((snap.get("positions") or {}).keys()) or list(chars.keys())
+            return [n for n in base if _is_alive(chars, n)]
 
         def _hostiles_present(threshold: int = -10) -> bool:
-            names = _living_field_names()
+            # One snapshot read serves both the liveness filter and the relation scan
+            snap = world.snapshot()
+            names = _living_field_names(snap)
             if len(names) <= 1:
                 return False
-            snap_rel = world.snapshot().get("relations") or {}
+            snap_rel = snap.get("relations") or {}
             for i, a in enumerate(names):
                 for b in names[i + 1 :]:
                     try:
@@ -2577,6 +3040,17 @@ async def run_demo(
                         return True
             return False
 
+        # Capabilities are fixed for the whole run: probe them once, not per actor turn
+        list_statuses = getattr(world, "list_statuses", None)
+        wait_if_requested = (
+            getattr(pause_gate, "wait_if_requested", None) if pause_gate is not None else None
+        )
+        read_player_input = (
+            player_input_provider if callable(player_input_provider) else None
+        )
+        # Participants are fixed once the run starts; rotate over one frozen order
+        turn_order: Tuple[str, ...] = tuple(str(n) for n in allowed_names_world or [])
+
         while True:
             try:
                 rt = world.runtime()
@@ -2619,13 +3093,10 @@ async def run_demo(
 
             combat_cleared = False
             # 按参与者名称轮转；玩家与 NPC 均在其中
-            for name in list(allowed_names_world) or []:
-                name = str(name)
+            for name in turn_order:
                 # Skip turn only if the character is truly dead (hp<=0 and not in dying state)
                 try:
-                    sheet = (world.snapshot().get("characters") or {}).get(
-                        name, {}
-                    ) or {}
+                    sheet = world.character(name)
                     hpv = int(sheet.get("hp", 1))
                     dt = sheet.get("dying_turns_left", None)
                     is_dead = (hpv <= 0) and (dt is None)
@@ -2678,16 +3149,16 @@ async def run_demo(
                     # so each turn gets "世界概要 + 行动记忆 + 指导 prompt" together.
                     if CTX_BROADCAST_CONTEXT_TO_OBSERVERS:
                         try:
-                            await bcast(
-                                ctx,
-                                hub,
-                                Msg(
-                                    "Host",
-                                    _world_summary_text(world.snapshot()),
-                                    "assistant",
-                                ),
-                                phase="context:world",
-                            )
+                            # 概要与上次广播相同（世界无可见变化）时跳过，避免重复灌入观察者记忆
+                            summary_now = _world_summary_text(world.snapshot())
+                            if summary_now != ctx.last_world_summary:
+                                await bcast(
+                                    ctx,
+                                    hub,
+                                    Msg("Host", summary_now, "assistant"),
+                                    phase="context:world",
+                                )
+                                ctx.last_world_summary = summary_now
                         except Exception as exc:
                             # 记录世界概要渲染/广播失败，不中断回合
                             _emit(
@@ -2716,19 +3187,8 @@ async def run_demo(
                     ts = ts_all.get(name, {}) or {}
                     # 优先处理对白（中性呈现）：取最近一条来自受控角色的对白（仅后端识别，不在文本中暴露身份）
                     lines_priv: List[str] = []
-                    priority_msg = None  # (speaker, text)
-                    try:
-                        for e in reversed(CHAT_LOG):
-                            sp = str(e.get("actor") or "")
-                            if not sp or sp == "Host":
-                                continue
-                            if str(actor_types.get(sp, "npc")) == "player":
-                                txtp = str(e.get("text") or "").strip()
-                                if txtp:
-                                    priority_msg = (sp, txtp)
-                                    break
-                    except Exception:
-                        priority_msg = None
+                    # (speaker, text), tracked by bcast instead of rescanning CHAT_LOG
+                    priority_msg = ctx.last_player_line
                     if priority_msg is not None:
                         sp, txtp = priority_msg
                         # 关系分值与类别（name -> sp）
@@ -2758,16 +3218,20 @@ async def run_demo(
                     bonus_used = bool(ts.get("bonus_used", False))
                     reaction_avail = bool(ts.get("reaction_available", True))
                     lines_priv.append(PRIV_TURN_RES_TITLE)
-                    lines_priv.append(f"- 移动：{mv_left}/{mv_max} 步")
+                    lines_priv.append(PRIV_TURN_RES_MOVE.format(left=mv_left, max=mv_max))
                     lines_priv.append(
-                        f"- 动作：{'可用' if not action_used else '已用'}；附赠动作：{'可用' if not bonus_used else '已用'}；反应：{'可用' if reaction_avail else '已用'}"
+                        PRIV_TURN_RES_ACTIONS.format(
+                            action=PRIV_AVAIL_LABEL[not action_used],
+                            bonus=PRIV_AVAIL_LABEL[not bonus_used],
+                            reaction=PRIV_AVAIL_LABEL[reaction_avail],
+                        )
                     )
                     # Hard combat rules to avoid invalid attacks
                     lines_priv.append(REACH_RULE_LINE)
                     lines_priv.append(PRIV_VALID_ACTION_RULE_LINE)
                     # 异常状态提示（统一：一个标题 + 每个状态一行）
                     try:
-                        sts = world.list_statuses(name) if hasattr(world, "list_statuses") else {}
+                        sts = list_statuses(name) if list_statuses is not None else {}
                     except Exception:
                         sts = {}
                     statuses_lines: List[str] = []
@@ -2781,10 +3245,14 @@ async def run_demo(
                         try:
                             rem = info.get("remaining")
                             turns = (int(rem) if rem is not None else None)
-                            duration_txt = (f"剩余 {turns} 回合" if turns is not None else "持续")
+                            duration_txt = (
+                                PRIV_STATUS_DURATION_TURNS.format(turns=turns)
+                                if turns is not None
+                                else PRIV_STATUS_DURATION_ONGOING
+                            )
                         except Exception:
                             turns = None
-                            duration_txt = "持续"
+                            duration_txt = PRIV_STATUS_DURATION_ONGOING
                         tmpl = PRIV_STATUS_LORE.get(key, PRIV_STATUS_LORE_DEFAULT)
                         # Format with safe fallbacks
                         line = tmpl.format(
@@ -2851,7 +3319,8 @@ async def run_demo(
                     private_section = None
 
                 # 2) 分支：player 走 CLI 输入；npc 走模型
-                if str(actor_types.get(name, "npc")) == "player":
+                is_player = name in ctx.player_names
+                if is_player:
                     # 玩家发言：优先使用外部提供的异步输入通道（用于网页端），否则回退到 CLI 输入。
                     # 阻塞等待玩家输入，以保留“玩家优先发言”的体验（不自动跳过）。
                     try:
@@ -2864,10 +3333,10 @@ async def run_demo(
                     except Exception:
                         pass
                     text_in = ""
-                    if callable(player_input_provider):
+                    if read_player_input is not None:
                         try:
                             # 阻塞等待队列中提交的文本
-                            text_in = str((await player_input_provider(name)) or "").strip()  # type: ignore[arg-type]
+                            text_in = str((await read_player_input(name)) or "").strip()
                         except Exception:
                             text_in = ""
                     else:
@@ -2893,7 +3362,7 @@ async def run_demo(
                     await npc_ephemeral_say(ctx, name, private_section, hub, recap_msg)
 
                 # Close player input prompt if any (frontend expects an explicit end signal)
-                if str(actor_types.get(name, "npc")) == "player":
+                if is_player:
                     try:
                         _emit(
                             "system",
@@ -2932,11 +3401,9 @@ async def run_demo(
                 )
 
                 # Soft pause: if a pause was requested, block here (between actors)
-                if pause_gate is not None:
+                if wait_if_requested is not None:
                     try:
-                        await getattr(pause_gate, "wait_if_requested")(
-                            after_actor=name, round_val=current_round
-                        )
+                        await wait_if_requested(after_actor=name, round_val=current_round)
                     except Exception:
                         # Defensive: never break the loop due to pause gate errors
                         pass
@@ -2972,7 +3439,25 @@ async def run_demo(
         )
 
 
+# Last rendered world summary, keyed on the snapshot's world version
+_SUMMARY_CACHE: Optional[Tuple[int, str]] = None
+
+
 def _world_summary_text(snap: dict) -> str:
+    """Render the world summary; reuses the last text while the version is unchanged."""
+    global _SUMMARY_CACHE
+    version = snap.get("version")
+    if isinstance(version, int):
+        cached = _SUMMARY_CACHE
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    text = _render_world_summary(snap)
+    if isinstance(version, int):
+        _SUMMARY_CACHE = (version, text)
+    return text
+
+
+def _render_world_summary(snap: dict) -> str:
     try:
         t = int(snap.get("time_min", 0))
     except Exception:
@@ -3053,7 +3538,36 @@ def _bootstrap_runtime(
     story_cfg = load_story_config(selected_story_id)
     characters = load_characters()
     weapons = load_weapons() or {}
-    if is_dataclass(model_cfg_obj):
+    return _finish_bootstrap(
+        model_cfg_obj, story_cfg, characters, weapons, for_server=for_server
+    )
+
+
+async def _bootstrap_runtime_async(
+    *, for_server: bool = False, selected_story_id: Optional[str] = None
+):
+    """_bootstrap_runtime for async callers: config files are read concurrently
+    in worker threads so the event loop (websockets, other sessions) keeps running."""
+    model_cfg_obj, story_cfg, characters, weapons = await asyncio.gather(
+        asyncio.to_thread(load_model_config),
+        asyncio.to_thread(load_story_config, selected_story_id),
+        asyncio.to_thread(load_characters),
+        asyncio.to_thread(load_weapons),
+    )
+    return _finish_bootstrap(
+        model_cfg_obj, story_cfg, characters, weapons or {}, for_server=for_server
+    )
+
+
+def _finish_bootstrap(
+    model_cfg_obj: Any,
+    story_cfg: dict,
+    characters: dict,
+    weapons: dict,
+    *,
+    for_server: bool,
+):
+    if is_dataclass(model_cfg_obj) and not isinstance(model_cfg_obj, type):
         model_cfg: Dict[str, Any] = asdict(model_cfg_obj)
     else:
         model_cfg = dict(getattr(model_cfg_obj, "__dict__", {}) or {})
@@ -3068,6 +3582,15 @@ def _bootstrap_runtime(
     return model_cfg, story_cfg, characters, weapons, world, log_ctx, root
 
 
+def _event_loop_factory() -> Optional[Callable[[], asyncio.AbstractEventLoop]]:
+    """uvloop's loop factory when installed (ships with uvicorn[standard]), else stdlib."""
+    try:
+        import uvloop  # type: ignore
+    except Exception:
+        return None
+    return uvloop.new_event_loop
+
+
 def main() -> None:
     print("============================================================")
     print("NPC Talk Demo (Orchestrator: main.py)")
@@ -3079,16 +3602,7 @@ def main() -> None:
     )
 
     # Clean prompt dumps at run start; keep only latest per actor during run
-    try:
-        prompts_dir = root / "logs" / "prompts"
-        if prompts_dir.exists():
-            for _p in prompts_dir.glob("*.txt"):
-                try:
-                    _p.unlink()
-                except Exception:
-                    pass
-    except Exception:
-        pass
+    _clear_prompt_dumps(root)
 
     # Emit function adapter
     def emit(*, event_type: str, actor=None, phase=None, turn=None, data=None) -> None:
@@ -3151,9 +3665,9 @@ def main() -> None:
     def build_agent(name, persona, model_cfg, **kwargs):
         return make_kimi_npc(name, persona, model_cfg, **kwargs)
 
-    try:
-        asyncio.run(
-            run_demo(
+    async def _run() -> None:
+        try:
+            await run_demo(
                 emit=emit,
                 build_agent=build_agent,
                 tool_fns=tool_list,
@@ -3164,32 +3678,54 @@ def main() -> None:
                 characters=characters,
                 world=world,
             )
-        )
+        finally:
+            # Shared clients are bound to this event loop; release them with it
+            await close_shared_models()
+
+    try:
+        with asyncio.Runner(loop_factory=_event_loop_factory()) as runner:
+            runner.run(_run())
     except KeyboardInterrupt:
         pass
     finally:
         log_ctx.close()
 
 
-import sys
-import argparse
-from collections import deque
-
-# Optional server deps (only required in server mode)
-try:  # lazy import to keep --once usable without extra deps
-    from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+# Optional server deps (only required in server mode). Placeholders until
+# _import_server_deps() runs, so the CLI path never pays for fastapi/uvicorn.
+# They stay module globals because FastAPI resolves the handlers' (string)
+# annotations such as `Request`/`WebSocket` against this module's namespace.
+if TYPE_CHECKING:  # pragma: no cover - annotations only
+    import uvicorn
+    from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+    from fastapi.middleware.cors import CORSMiddleware
     from fastapi.responses import JSONResponse
     from fastapi.staticfiles import StaticFiles
-    from fastapi.middleware.cors import CORSMiddleware
-    import uvicorn
-except Exception:  # pragma: no cover - defensive for environments without deps
-    FastAPI = None  # type: ignore
-    WebSocket = None  # type: ignore
-    WebSocketDisconnect = Exception  # type: ignore
-    JSONResponse = None  # type: ignore
-    StaticFiles = None  # type: ignore
-    CORSMiddleware = None  # type: ignore
-    uvicorn = None  # type: ignore
+else:
+    FastAPI = None
+    WebSocket = None
+    WebSocketDisconnect = Exception
+    Request = None
+    JSONResponse = None
+    StaticFiles = None
+    CORSMiddleware = None
+    uvicorn = None
+
+
+@functools.lru_cache(maxsize=None)
+def _import_server_deps() -> bool:
+    """Import fastapi/uvicorn on first use; False when they are not installed."""
+    global FastAPI, WebSocket, WebSocketDisconnect, Request
+    global JSONResponse, StaticFiles, CORSMiddleware, uvicorn
+    try:
+        import uvicorn
+        from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+        from fastapi.middleware.cors import CORSMiddleware
+        from fastapi.responses import JSONResponse
+        from fastapi.staticfiles import StaticFiles
+    except Exception:  # pragma: no cover - defensive for environments without deps
+        return False
+    return True
 
 # Use the same asyncio import consistently
 import uuid as _uuid
@@ -3246,37 +3782,35 @@ class _EventBridge:
         self._last_seq = max(self._last_seq, seq)
         self._buf.append(event_dict)
         # broadcast
-        dead = []
-        for ws in list(self._clients):
-            try:
-                await ws.send_json({"type": "event", "event": event_dict})
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            try:
-                await self.unregister(ws)
-            except Exception:
-                pass
+        await self._fanout({"type": "event", "event": event_dict})
+
+    async def _fanout(self, msg: dict) -> None:
+        """Send one message to every client concurrently; drop clients that fail.
+
+        A slow socket no longer delays delivery to the others.
+        """
+        clients = list(self._clients)
+        if not clients:
+            return
+        results = await asyncio.gather(
+            *(ws.send_json(msg) for ws in clients), return_exceptions=True
+        )
+        for ws, res in zip(clients, results):
+            if isinstance(res, Exception):
+                try:
+                    await self.unregister(ws)
+                except Exception:
+                    pass
 
     async def send_control(self, typ: str, payload: dict | None = None) -> None:
         """Broadcast a control message to all clients (non-event)."""
-        dead = []
         msg = {"type": str(typ)}
         if payload:
             try:
                 msg.update(dict(payload))
             except Exception:
                 pass
-        for ws in list(self._clients):
-            try:
-                await ws.send_json(msg)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            try:
-                await self.unregister(ws)
-            except Exception:
-                pass
+        await self._fanout(msg)
 
     async def send_end(self) -> None:
         await self.send_control("end")
@@ -3295,6 +3829,9 @@ class _ServerState:
         self.selected_story_id: str = ""
         # soft-pause gate (initialized when a session starts)
         self.pause_gate: Optional["PauseGate"] = None
+        # held from the is_running() check until the runner task exists, so two
+        # overlapping start requests (double-click, HTTP + WS) cannot both bootstrap
+        self.start_lock = asyncio.Lock()
 
     def is_running(self) -> bool:
         return bool(self.task) and not bool(self.task.done()) and self.running
@@ -3417,6 +3954,13 @@ async def _start_game_server_mode(
     *, selected_story_id: Optional[str] = None
 ) -> Tuple[bool, str]:
     """Start one game run in background if not already running."""
+    async with _STATE.start_lock:
+        return await _start_game_server_mode_locked(selected_story_id=selected_story_id)
+
+
+async def _start_game_server_mode_locked(
+    *, selected_story_id: Optional[str] = None
+) -> Tuple[bool, str]:
     if _STATE.is_running():
         return True, "already running"
 
@@ -3429,7 +3973,7 @@ async def _start_game_server_mode(
             pass
 
     model_cfg, story_cfg, characters, weapons, world, log_ctx, root = (
-        _bootstrap_runtime(
+        await _bootstrap_runtime_async(
             for_server=True,
             selected_story_id=_STATE.selected_story_id or None,
         )
@@ -3531,38 +4075,8 @@ async def _start_game_server_mode(
             await _STATE.bridge.clear()
             # Pre-populate world & snapshot from story config so hello has positions
             try:
-                story_positions: Dict[str, Tuple[int, int]] = {}
-
-                def _ingest_positions(raw: Any) -> None:
-                    if not isinstance(raw, dict):
-                        return
-                    for actor_name, pos in raw.items():
-                        if isinstance(pos, (list, tuple)) and len(pos) >= 2:
-                            try:
-                                story_positions[str(actor_name)] = (
-                                    int(pos[0]),
-                                    int(pos[1]),
-                                )
-                            except Exception:
-                                continue
-
-                if isinstance(story_cfg, dict):
-                    _ingest_positions(story_cfg.get("initial_positions") or {})
-                    _ingest_positions(story_cfg.get("positions") or {})
-                    initial_section = story_cfg.get("initial")
-                    if isinstance(initial_section, dict):
-                        _ingest_positions(initial_section.get("positions") or {})
                 # apply into world before first snapshot
-                for nm, (x, y) in story_positions.items():
-                    try:
-                        world.set_position(nm, x, y)
-                    except Exception:
-                        pass
-                if story_positions:
-                    try:
-                        world.set_participants(list(story_positions.keys()))
-                    except Exception:
-                        pass
+                _apply_story_positions(world, _collect_story_positions(story_cfg))
                 # snapshot after pre-population
                 try:
                     _STATE.last_snapshot = world.snapshot()
@@ -3574,16 +4088,7 @@ async def _start_game_server_mode(
                 except Exception:
                     _STATE.last_snapshot = {}
             # Clean prompt dumps at session start; keep only latest per actor during run
-            try:
-                prompts_dir = root / "logs" / "prompts"
-                if prompts_dir.exists():
-                    for _p in prompts_dir.glob("*.txt"):
-                        try:
-                            _p.unlink()
-                        except Exception:
-                            pass
-            except Exception:
-                pass
+            _clear_prompt_dumps(root)
 
             # Bind pause/resume hooks to broadcast control messages
             async def _on_paused(payload: dict) -> None:
@@ -3697,6 +4202,13 @@ async def _stop_game_server_mode() -> Tuple[bool, str]:
 # Multi-session variants operating on a specific _ServerState
 async def _start_game_for(
     state: _ServerState, *, selected_story_id: Optional[str] = None
+) -> Tuple[bool, str]:
+    async with state.start_lock:
+        return await _start_game_for_locked(state, selected_story_id=selected_story_id)
+
+
+async def _start_game_for_locked(
+    state: _ServerState, *, selected_story_id: Optional[str] = None
 ) -> Tuple[bool, str]:
     if state.is_running():
         return True, "already running"
@@ -3708,7 +4220,7 @@ async def _start_game_for(
             pass
 
     model_cfg, story_cfg, characters, weapons, world, log_ctx, root = (
-        _bootstrap_runtime(
+        await _bootstrap_runtime_async(
             for_server=True,
             selected_story_id=state.selected_story_id or None,
         )
@@ -3768,37 +4280,7 @@ async def _start_game_for(
             state.running = True
             await state.bridge.clear()
             try:
-                story_positions: Dict[str, Tuple[int, int]] = {}
-
-                def _ingest_positions(raw: Any) -> None:
-                    if not isinstance(raw, dict):
-                        return
-                    for actor_name, pos in raw.items():
-                        if isinstance(pos, (list, tuple)) and len(pos) >= 2:
-                            try:
-                                story_positions[str(actor_name)] = (
-                                    int(pos[0]),
-                                    int(pos[1]),
-                                )
-                            except Exception:
-                                continue
-
-                if isinstance(story_cfg, dict):
-                    _ingest_positions(story_cfg.get("initial_positions") or {})
-                    _ingest_positions(story_cfg.get("positions") or {})
-                    initial_section = story_cfg.get("initial")
-                    if isinstance(initial_section, dict):
-                        _ingest_positions(initial_section.get("positions") or {})
-                for nm, (x, y) in story_positions.items():
-                    try:
-                        world.set_position(nm, x, y)
-                    except Exception:
-                        pass
-                if story_positions:
-                    try:
-                        world.set_participants(list(story_positions.keys()))
-                    except Exception:
-                        pass
+                _apply_story_positions(world, _collect_story_positions(story_cfg))
                 try:
                     state.last_snapshot = world.snapshot()
                 except Exception:
@@ -3810,16 +4292,7 @@ async def _start_game_for(
                     state.last_snapshot = {}
 
             # Clean prompt dumps at session start; keep only latest per actor during run
-            try:
-                prompts_dir = root / "logs" / "prompts"
-                if prompts_dir.exists():
-                    for _p in prompts_dir.glob("*.txt"):
-                        try:
-                            _p.unlink()
-                        except Exception:
-                            pass
-            except Exception:
-                pass
+            _clear_prompt_dumps(root)
 
             async def _on_paused(payload: dict) -> None:
                 try:
@@ -3923,7 +4396,7 @@ async def _stop_game_for(state: _ServerState) -> Tuple[bool, str]:
 
 
 def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] = None):
-    if FastAPI is None or uvicorn is None:
+    if not _import_server_deps():
         raise RuntimeError(
             "FastAPI/uvicorn not installed. Install fastapi and uvicorn[standard]."
         )
@@ -3946,7 +4419,7 @@ def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] =
     # --- Simple config editor endpoints (story/characters/weapons) ---
     # These endpoints enable the built-in settings editor (bottom drawer) to
     # fetch and persist JSON configs safely without restarting automatically.
-    cfg_dir = project_root() / "configs"
+    cfg_dir = _configs_dir()
 
     def _cfg_path(name: str) -> Path:
         m = {
@@ -3959,9 +4432,8 @@ def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] =
         return m[name]
 
     def _json_load_text(p: Path) -> dict:
-        # no fallback: read and propagate errors
-        with p.open("r", encoding="utf-8") as f:
-            return json.load(f)
+        # no fallback: read and propagate errors; bytes come from the mtime cache
+        return _json_loads(_read_config_bytes(p))
 
     def _validate_story(obj: dict) -> tuple[bool, str]:
         """Validate story config.
@@ -4059,9 +4531,7 @@ def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] =
             except Exception:
                 return False, f"weapon {wid}.reach_steps must be an integer"
             dmg = str(w.get("damage") or "").lower()
-            import re as _re
-
-            if not _re.fullmatch(r"\d*d\d+(?:[+-]\d+)?", dmg):
+            if not _WEAPON_DAMAGE_RE.fullmatch(dmg):
                 return False, f"weapon {wid}.damage must be NdM[+/-K], got '{dmg}'"
         return True, "ok"
 
@@ -4101,6 +4571,8 @@ def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] =
             json.dump(obj, f, ensure_ascii=False, indent=2)
             f.write("\n")
         tmp.replace(path)
+        # drop cached bytes outright rather than rely on stat() noticing the save
+        _read_bytes_at.cache_clear()
 
     @app.get("/api/config/{name}")
     async def api_get_config(name: str):  # type: ignore[no-redef]
@@ -4233,7 +4705,7 @@ def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] =
         # Build a fresh world snapshot mirroring server bootstrap logic, but without running the game loop
         try:
             model_cfg, story_cfg, characters, weapons, world, log_ctx, root = (
-                _bootstrap_runtime(
+                await _bootstrap_runtime_async(
                     for_server=True,
                     selected_story_id=sid,
                 )
@@ -4251,37 +4723,10 @@ def _make_app(web_dir: Optional[Path], *, allow_cors_from: Optional[list[str]] =
                 pass
 
             # Ingest starting positions from story config (supports initial_positions/positions and initial.positions)
-            story_positions: Dict[str, Tuple[int, int]] = {}
-            try:
-                _parse_story_positions(
-                    story_cfg.get("initial_positions") or {}, story_positions
-                )
-            except Exception:
-                pass
             try:
-                _parse_story_positions(
-                    story_cfg.get("positions") or {}, story_positions
-                )
-            except Exception:
-                pass
-            try:
-                initial_section = story_cfg.get("initial")
-                if isinstance(initial_section, dict):
-                    _parse_story_positions(
-                        initial_section.get("positions") or {}, story_positions
-                    )
+                _apply_story_positions(world, _collect_story_positions(story_cfg))
             except Exception:
                 pass
-            for nm, (x, y) in story_positions.items():
-                try:
-                    world.set_position(nm, x, y)
-                except Exception:
-                    pass
-            if story_positions:
-                try:
-                    world.set_participants(list(story_positions.keys()))
-                except Exception:
-                    pass
 
             # Apply scene fields (name/objectives/details/weather/time)
             try:
@@ -4519,6 +4964,8 @@ def main_once() -> None:
 
 
 def _parse_args(argv: list[str]) -> argparse.Namespace:
+    import argparse  # CLI entry only; importers of this module never need it
+
     p = argparse.ArgumentParser(description="NPC Talk Demo server/CLI")
     p.add_argument(
         "--once", action="store_true", help="Run one game in CLI mode and exit"
@@ -4545,7 +4992,7 @@ if __name__ == "__main__":
     if args.once:
         main_once()
     else:
-        if FastAPI is None or uvicorn is None:
+        if not _import_server_deps():
             print(
                 "FastAPI/uvicorn is required for server mode. Install with: pip install fastapi 'uvicorn[standard]'"
             )
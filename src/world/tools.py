@@ -1,9 +1,11 @@
 # Minimal world state and tools for the demo; designed to be pure and easy to test.
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, Tuple, Any, List, Optional, Set, Union
+from typing import Dict, Tuple, Any, List, Optional, Set, Union, Iterable
+import bisect
 import math
 import random
+import re
 try:
     from agentscope.tool import ToolResponse  # type: ignore
     from agentscope.message import TextBlock  # type: ignore
@@ -204,7 +206,9 @@ def reset_world() -> None:
     Used by server restarts to guarantee a clean state across sessions.
     """
     global WORLD
-    WORLD = World()
+    # Keep `version` monotonic across resets so version-keyed caches never
+    # mistake a fresh world for an unchanged one.
+    WORLD = World(version=int(WORLD.version) + 1)
 
 def set_participants(names: List[str]) -> ToolResponse:
     """Replace the participants list with the given ordered names.
@@ -811,6 +815,7 @@ def add_objective(obj: str):
     name = str(obj)
     WORLD.objectives.append(name)
     WORLD.objective_status[name] = WORLD.objective_status.get(name, "pending")
+    WORLD._touch()
     text = f"新增目标：{name}"
     return ToolResponse(content=[TextBlock(type="text", text=text)], metadata={"objectives": list(WORLD.objectives), "status": dict(WORLD.objective_status)})
 
@@ -927,6 +932,7 @@ def _reset_turn_tokens_for(name: Optional[str]):
         "help_target": None,
         "ready": None,  # {trigger: str, action: dict}
     }
+    WORLD._touch()
     # Note: legacy 'dodge' condition/token removed; no per-turn cleanup needed.
 
 
@@ -1043,11 +1049,13 @@ def consume_movement(name: str, distance_steps: float) -> ToolResponse:
         )
     if steps > left:
         st["move_left"] = 0
+        WORLD._touch()
         return ToolResponse(
             content=[TextBlock(type="text", text=f"{nm} 试图移动 {format_distance_steps(steps)}，但仅剩 {format_distance_steps(left)}；按剩余移动结算")],
             metadata={"ok": False, "left_steps": 0, "attempted_steps": steps},
         )
     st["move_left"] = left - steps
+    WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"{nm} 移动 {format_distance_steps(steps)}（剩余 {format_distance_steps(st['move_left'])}）")],
         metadata={"ok": True, "left_steps": st["move_left"], "spent_steps": steps},
@@ -1065,6 +1073,7 @@ def set_cover(name: str, level: str):
     if level not in ("none", "half", "three_quarters", "total"):
         return ToolResponse(content=[TextBlock(type="text", text=f"未知掩体等级 {level}")], metadata={"ok": False})
     WORLD.cover[str(name)] = level
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"掩体：{name} -> {level}")], metadata={"ok": True, "name": name, "cover": level})
 
 
@@ -1244,6 +1253,7 @@ def act_dash(name: str):
     st = WORLD.turn_state.setdefault(nm, {})
     spd_steps = int(WORLD.speeds.get(nm, _default_move_steps()))
     st["move_left"] = int(st.get("move_left", spd_steps)) + spd_steps
+    WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"{nm} 冲刺（移动力+{format_distance_steps(spd_steps)}）")],
         metadata={"ok": True, "move_left_steps": st["move_left"]}
@@ -1259,6 +1269,7 @@ def act_disengage(name: str):
     use_action(nm, "action")
     st = WORLD.turn_state.setdefault(nm, {})
     st["disengage"] = True
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 脱离接触（本回合移动不引发借机攻击）")], metadata={"ok": True})
 
 
@@ -1274,6 +1285,7 @@ def act_help(name: str, target: str):
     use_action(nm, "action")
     st = WORLD.turn_state.setdefault(nm, {})
     st["help_target"] = str(target)
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 协助 {target}（其下一次检定或攻击获得优势）")], metadata={"ok": True, "target": target})
 
 
@@ -1346,6 +1358,7 @@ def act_ready(name: str, trigger: str, reaction_action: Dict[str, Any]) -> ToolR
     use_action(nm, "action")
     st = WORLD.turn_state.setdefault(nm, {})
     st["ready"] = {"trigger": str(trigger or ""), "action": dict(reaction_action or {})}
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 预备：{trigger}")], metadata={"ok": True})
 
 
@@ -1353,6 +1366,7 @@ def act_ready(name: str, trigger: str, reaction_action: Dict[str, Any]) -> ToolR
 def set_character(name: str, hp: int, max_hp: int):
     """Create/update a character with hp and max_hp."""
     WORLD.characters[name] = {"hp": int(hp), "max_hp": int(max_hp)}
+    WORLD._touch()
     return ToolResponse(
         content=[TextBlock(type="text", text=f"设定角色 {name}：HP {int(hp)}/{int(max_hp)}")],
         metadata={"name": name, "hp": int(hp), "max_hp": int(max_hp)},
@@ -1738,6 +1752,7 @@ def heal(name: str, amount: int):
     st = WORLD.characters.setdefault(nm, {"hp": 0, "max_hp": 0})
     max_hp = int(st.get("max_hp", 0))
     st["hp"] = min(max_hp if max_hp > 0 else st.get("hp", 0), int(st.get("hp", 0)) + amt)
+    WORLD._touch()
     parts = [TextBlock(type="text", text=f"{nm} 恢复 {amt} 点生命，HP {st['hp']}/{st.get('max_hp', st['hp'])}")]
     # If healed above 0 while dying, clear dying state
     if st.get("hp", 0) > 0 and st.get("dying_turns_left") is not None:
@@ -1767,6 +1782,7 @@ def spend_mp(name: str, amount: int) -> ToolResponse:
     if cur < amt:
         return ToolResponse(content=[TextBlock(type="text", text=f"{nm} MP 不足（需要 {amt}，当前 {cur}）")], metadata={"ok": False, "error_type": "mp_insufficient", "need": amt, "mp": cur})
     st["mp"] = cur - amt
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 消耗 MP {amt}（剩余 {st['mp']}）")], metadata={"ok": True, "mp": st["mp"], "spent": amt})
 
 
@@ -1777,6 +1793,7 @@ def recover_mp(name: str, amount: int) -> ToolResponse:
     cap = int(st.get("max_mp", 0))
     cur = int(st.get("mp", 0))
     st["mp"] = min(cap if cap > 0 else cur + amt, cur + amt)
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"{nm} 恢复 MP {amt}（{st['mp']}/{cap or '?'}）")], metadata={"ok": True, "mp": st["mp"], "max_mp": cap})
 
 
@@ -1966,12 +1983,14 @@ def set_weapon_defs(defs: Dict[str, Dict[str, Any]]):
         WORLD.weapon_defs = cleaned
     except Exception:
         WORLD.weapon_defs = {}
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"武器表载入：{len(WORLD.weapon_defs)} 项")], metadata={"count": len(WORLD.weapon_defs)})
 
 
 def define_weapon(weapon_id: str, data: Dict[str, Any]):
     wid = str(weapon_id)
     WORLD.weapon_defs[wid] = dict(data or {})
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"武器登记：{wid}")], metadata={"id": wid, **WORLD.weapon_defs[wid]})
 
 
@@ -2072,9 +2091,7 @@ def attack_with_weapon(
             dmg_expr2 = _replace_ability_tokens(damage_expr, base_mod)
             # If any alpha token other than the dice 'd' remains, treat as invalid.
             # This allows forms like '1d6+1' while rejecting stray tokens (e.g., 'POW').
-            import re as _re
-            _chk = _re.sub(r"[dD]", "", str(dmg_expr2))
-            if _re.search(r"[A-Za-z]", _chk):
+            if _NON_DICE_ALPHA_RE.search(str(dmg_expr2)):
                 return ToolResponse(content=parts + [TextBlock(type="text", text=f"武器伤害表达式不被支持：{damage_expr}")], metadata={"ok": False, "error_type": "damage_expr_invalid", "weapon_id": weapon})
             dmg_res = roll_dice(dmg_expr2)
             total = int((dmg_res.metadata or {}).get("total", 0))
@@ -2411,6 +2428,8 @@ def set_arts_defs(defs: Dict[str, Dict[str, Any]]):
     except Exception:
         WORLD.arts_defs = {}
         raise
+    finally:
+        WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"术式表载入：{len(WORLD.arts_defs)} 项")], metadata={"count": len(WORLD.arts_defs)})
 
 
@@ -2451,6 +2470,13 @@ def get_arts_defs() -> Dict[str, Dict[str, Any]]:
     return out
 
 
+# Extended CoC ability forms: TOKEN, TOKEN_RAW, TOKEN_10, TOKEN_5 (exclude POW)
+_ABILITY_TOKEN_RE = re.compile(r"\b(STR|DEX|CON|INT|SIZ|APP|EDU)(?:_(RAW|10|5))?\b")
+_DICE_EXPR_INVALID_RE = re.compile(r"[^0-9d+\-]")
+_ALPHA_RE = re.compile(r"[A-Za-z]")
+_NON_DICE_ALPHA_RE = re.compile(r"[A-CE-Za-ce-z]")
+
+
 def _replace_art_tokens(attacker: str, expr: str, *, mp_spent: int = 0, base_cost: int = 0) -> str:
     """Replace token placeholders in arts formulas (no POW/POWER/MP in expressions).
 
@@ -2460,42 +2486,25 @@ def _replace_art_tokens(attacker: str, expr: str, *, mp_spent: int = 0, base_cos
 
     说明：不再支持 POWER/POW/MP 类占位符。若表达式仍包含这些标记，将在调用处被判定为无效表达式。
     """
-    import re  # local import to avoid changing module top
-
-    def _coc_raw_for(name: str, ab_name: str) -> int:
-        st = WORLD.characters.get(str(name), {})
-        coc = dict(st.get("coc") or {})
-        ch = {k.upper(): int(v) for k, v in (coc.get("characteristics") or {}).items()}
-        return int(ch.get(str(ab_name).upper(), 50))
-
-    def _tens(v: int) -> int:
-        try:
-            return max(0, int(v) // 10)
-        except Exception:
-            return 0
+    st = WORLD.characters.get(str(attacker), {})
+    coc = dict(st.get("coc") or {})
+    ch = {k.upper(): v for k, v in (coc.get("characteristics") or {}).items()}
 
-    def _div5(v: int) -> int:
+    def _sub(m: "re.Match[str]") -> str:
+        # MP 不再被替换；在调用处统一做表达式有效性检查
         try:
-            return max(0, int(v) // 5)
+            raw = int(ch.get(m.group(1), 50))
         except Exception:
-            return 0
-
-    s = str(expr or "")
-
-    # MP 不再被替换；在调用处统一做表达式有效性检查
-
-    # Extended CoC ability forms: *_RAW, *_10, *_5 (exclude POW)
-    for token in ("STR", "DEX", "CON", "INT", "SIZ", "APP", "EDU"):
-        raw = _coc_raw_for(attacker, token)
-        s = re.sub(rf"\b{token}_RAW\b", str(raw), s)
-        s = re.sub(rf"\b{token}_10\b", str(_tens(raw)), s)
-        s = re.sub(rf"\b{token}_5\b", str(_div5(raw)), s)
-
-    # Base ability tokens -> tens by default (exclude POW)
-    for token in ("STR", "DEX", "CON", "INT", "SIZ", "APP", "EDU"):
-        raw = _coc_raw_for(attacker, token)
-        s = re.sub(rf"\b{token}\b", str(_tens(raw)), s)
-
+            raw = 50
+        suffix = m.group(2)
+        if suffix == "RAW":
+            return str(raw)
+        if suffix == "5":
+            return str(max(0, raw // 5))
+        # Base ability tokens and *_10 -> tens (exclude POW)
+        return str(max(0, raw // 10))
+
+    s = _ABILITY_TOKEN_RE.sub(_sub, str(expr or ""))
     return s
 
 
@@ -2602,12 +2611,11 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
     if success and dmg_expr:
         expr = _replace_art_tokens(attacker, dmg_expr, mp_spent=eff_spent, base_cost=mp_cost)
         # 表达式中不允许出现字母（仅允许 NdM 与 +/- 常数）；若含未替换标记（如 MP/POW），直接报错
-        import re as _re
         # Allow classic dice notation NdM with optional +/- constants. We forbid any
         # letters other than 'd' (case-insensitive) to prevent leaking tokens like
         # POW/MP/skill names into the arithmetic expression.
         expr_norm = str(expr or "").lower().replace(" ", "")
-        if _re.search(r"[^0-9d+\-]", expr_norm):
+        if _DICE_EXPR_INVALID_RE.search(expr_norm):
             return ToolResponse(
                 content=parts + [TextBlock(type="text", text=f"术式伤害表达式不被支持：{dmg_expr}")],
                 metadata={"ok": False, "error_type": "art_damage_expr_invalid", "expr": dmg_expr},
@@ -2637,9 +2645,8 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
 
     if success and heal_expr:
         expr = _replace_art_tokens(attacker, heal_expr, mp_spent=eff_spent, base_cost=mp_cost)
-        import re as _re
         expr_norm = str(expr or "").lower().replace(" ", "")
-        if _re.search(r"[^0-9d+\-]", expr_norm):
+        if _DICE_EXPR_INVALID_RE.search(expr_norm):
             return ToolResponse(
                 content=parts + [TextBlock(type="text", text=f"术式治疗表达式不被支持：{heal_expr}")],
                 metadata={"ok": False, "error_type": "art_heal_expr_invalid", "expr": heal_expr},
@@ -2659,8 +2666,7 @@ def cast_arts(attacker: str, art: str, target: Optional[str] = None, center: Opt
         eff = str(ctrl.get("effect"))
         dur_expr = str(ctrl.get("duration") or "1")
         dur_str = _replace_art_tokens(attacker, dur_expr, mp_spent=eff_spent, base_cost=mp_cost)
-        import re as _re
-        if _re.search(r"[A-Za-z]", dur_str):
+        if _ALPHA_RE.search(dur_str):
             return ToolResponse(content=parts + [TextBlock(type="text", text=f"术式持续时间表达式不被支持：{dur_expr}")], metadata={"ok": False, "error_type": "art_duration_expr_invalid", "expr": dur_expr})
         try:
             dur_val = int(eval(dur_str, {"__builtins__": {}}, {}))  # simple integer expression
@@ -2705,6 +2711,7 @@ def complete_objective(name: str, note: str = ""):
     WORLD.objective_status[nm] = "done"
     if note:
         WORLD.objective_notes[nm] = note
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"目标完成：{nm}")], metadata={"objectives": list(WORLD.objectives), "status": dict(WORLD.objective_status)})
 
 def block_objective(name: str, reason: str = ""):
@@ -2714,19 +2721,41 @@ def block_objective(name: str, reason: str = ""):
     WORLD.objective_status[nm] = "blocked"
     if reason:
         WORLD.objective_notes[nm] = reason
+    WORLD._touch()
     suffix = f"，理由：{reason}" if reason else ""
     return ToolResponse(content=[TextBlock(type="text", text=f"目标受阻：{nm}{suffix}")], metadata={"objectives": list(WORLD.objectives), "status": dict(WORLD.objective_status)})
 
 # ---- Event clock ----
+# WORLD.events is kept sorted by "at" (ties in scheduling order) so that due
+# events are always a prefix of the list.
+def _event_at(ev: Dict[str, Any]) -> int:
+    return int(ev.get("at", 0))
+
+def _make_event(name: str, at_min: int, note: str = "", effects: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    return {"name": str(name), "at": int(at_min), "note": str(note), "effects": list(effects or [])}
+
 def schedule_event(name: str, at_min: int, note: str = "", effects: Optional[List[Dict[str, Any]]] = None):
-    WORLD.events.append({"name": str(name), "at": int(at_min), "note": str(note), "effects": list(effects or [])})
-    WORLD.events.sort(key=lambda x: x.get("at", 0))
+    bisect.insort_right(WORLD.events, _make_event(name, at_min, note, effects), key=_event_at)
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"计划事件：{name}@{int(at_min)}分钟")], metadata={"queued": len(WORLD.events)})
 
+def schedule_events(specs: Iterable[Tuple[Any, ...]]):
+    """Queue several events at once; each spec is (name, at_min[, note[, effects]])."""
+    new = [_make_event(*spec) for spec in specs]
+    if new:
+        WORLD.events.extend(new)
+        WORLD.events.sort(key=_event_at)
+        WORLD._touch()
+    text = "；".join(f"{ev['name']}@{ev['at']}分钟" for ev in new)
+    return ToolResponse(content=[TextBlock(type="text", text=f"计划事件：{text}")] if new else [], metadata={"queued": len(WORLD.events)})
+
 def process_events():
     outputs: List[TextBlock] = []
-    due = [ev for ev in WORLD.events if int(ev.get("at", 0)) <= WORLD.time_min]
-    WORLD.events = [ev for ev in WORLD.events if int(ev.get("at", 0)) > WORLD.time_min]
+    cut = bisect.bisect_right(WORLD.events, int(WORLD.time_min), key=_event_at)
+    due = WORLD.events[:cut]
+    if due:
+        WORLD.events = WORLD.events[cut:]
+        WORLD._touch()
     for ev in due:
         name = ev.get("name", "(事件)")
         note = ev.get("note", "")
@@ -2766,6 +2795,7 @@ def process_events():
 # ---- Atmosphere helpers ----
 def adjust_tension(delta: int):
     WORLD.tension = max(0, min(5, int(WORLD.tension) + int(delta)))
+    WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"(气氛){'升' if delta>0 else '降' if delta<0 else '稳'}至 {WORLD.tension}")], metadata={"tension": WORLD.tension})
 
 def add_mark(text: str):
@@ -2774,6 +2804,7 @@ def add_mark(text: str):
         WORLD.marks.append(s)
         if len(WORLD.marks) > 10:
             WORLD.marks = WORLD.marks[-10:]
+        WORLD._touch()
     return ToolResponse(content=[TextBlock(type="text", text=f"(环境刻痕)+{s}")], metadata={"marks": list(WORLD.marks)})
 
 
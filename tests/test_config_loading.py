@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import os
+
+from src.main import _load_json
+
+
+def test_load_json_rereads_edited_file_and_returns_private_copies(tmp_path):
+    path = tmp_path / "cfg.json"
+    path.write_text('{"a": {"n": 1}}', encoding="utf-8")
+    first = _load_json(path)
+    first["a"]["n"] = 99
+    assert _load_json(path) == {"a": {"n": 1}}
+
+    path.write_text('{"a": {"n": 2}, "b": true}', encoding="utf-8")
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert _load_json(path) == {"a": {"n": 2}, "b": True}
+
+
+def test_load_json_sees_same_size_replace_within_mtime_granularity(tmp_path):
+    path = tmp_path / "cfg.json"
+    path.write_text('{"n": 1}', encoding="utf-8")
+    st = path.stat()
+    assert _load_json(path) == {"n": 1}
+
+    # editor-style save: write a temp file and replace(); same size, same mtime
+    tmp = tmp_path / "cfg.json.tmp"
+    tmp.write_text('{"n": 2}', encoding="utf-8")
+    os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    tmp.replace(path)
+    assert _load_json(path) == {"n": 2}
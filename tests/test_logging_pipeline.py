@@ -1,8 +1,16 @@
 from __future__ import annotations
 
 import json
+import time
 
-from src.main import Event, EventBus, EventType, StoryLogger, StructuredLogger
+from src.main import (
+    Event,
+    EventBus,
+    EventType,
+    StoryLogger,
+    StructuredLogger,
+    _flush_live_writers,
+)
 
 
 def test_event_serialisation_drops_none(tmp_path):
@@ -26,6 +34,25 @@ def test_event_serialisation_drops_none(tmp_path):
     assert "result" not in record
 
 
+def test_structured_logger_batches_writes(tmp_path):
+    bus = EventBus()
+    structured = StructuredLogger(tmp_path / "events.jsonl")
+    structured.FLUSH_LINES = 2
+    structured.FLUSH_INTERVAL_SEC = 3600
+    bus.subscribe(structured.handle)
+
+    bus.publish(Event(event_type=EventType.ACTION, actor="Amiya", data={"action": "move", "n": 1}))
+    assert (tmp_path / "events.jsonl").read_text(encoding="utf-8") == ""
+    bus.publish(Event(event_type=EventType.ACTION, actor="Amiya", data={"action": "move", "n": 2}))
+    bus.publish(Event(event_type=EventType.ACTION, actor="Amiya", data={"action": "move", "n": 3}))
+    lines = (tmp_path / "events.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["n"] for line in lines] == [1, 2]
+
+    structured.close()
+    lines = (tmp_path / "events.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["n"] for line in lines] == [1, 2, 3]
+
+
 def test_narrative_event_requires_text():
     bus = EventBus()
     event = Event(event_type=EventType.NARRATIVE, actor="Host", data={})
@@ -49,3 +76,95 @@ def test_story_logger_writes_human_log(tmp_path):
     content = (tmp_path / "story.log").read_text(encoding="utf-8").strip()
     assert "Hello" in content
     assert "Host" in content
+
+
+def test_story_logger_buffers_until_flush(tmp_path):
+    bus = EventBus()
+    story = StoryLogger(tmp_path / "story.log")
+    story.FLUSH_INTERVAL_SEC = 3600
+    bus.subscribe(story.handle)
+
+    bus.publish(Event(event_type=EventType.NARRATIVE, actor="Host", data={"text": "first"}))
+    bus.publish(Event(event_type=EventType.NARRATIVE, actor="Host", data={"text": "second"}))
+    assert (tmp_path / "story.log").read_text(encoding="utf-8") == ""
+
+    story.flush()
+    lines = (tmp_path / "story.log").read_text(encoding="utf-8").splitlines()
+    assert [line.rsplit(": ", 1)[-1] for line in lines] == ["first", "second"]
+    story.close()
+
+
+def test_story_logger_drops_recent_duplicates(tmp_path):
+    bus = EventBus()
+    story = StoryLogger(tmp_path / "story.log")
+    bus.subscribe(story.handle)
+
+    for text in ("again", "again", "other", "again"):
+        bus.publish(Event(event_type=EventType.NARRATIVE, actor="Amiya", data={"text": text}))
+    story.close()
+
+    lines = (tmp_path / "story.log").read_text(encoding="utf-8").splitlines()
+    assert [line.rsplit(": ", 1)[-1] for line in lines] == ["again", "other"]
+
+
+def test_event_serialisation_is_shared_between_subscribers():
+    bus = EventBus()
+    seen = []
+    bus.subscribe(lambda ev: seen.append(ev.to_dict()))
+    bus.subscribe(lambda ev: seen.append(ev.to_dict()))
+
+    published = bus.publish(
+        Event(event_type=EventType.NARRATIVE, actor="Host", data={"text": "hi"})
+    )
+
+    assert seen[0] is seen[1] is published.to_dict()
+    assert seen[0]["text"] == "hi"
+
+
+def test_idle_writer_is_flushed_in_background(tmp_path):
+    bus = EventBus()
+    story = StoryLogger(tmp_path / "story.log")
+    story.FLUSH_LINES = 100
+    story.FLUSH_INTERVAL_SEC = 0.05
+    bus.subscribe(story.handle)
+    bus.publish(Event(event_type=EventType.NARRATIVE, actor="Amiya", data={"text": "idle"}))
+
+    deadline = time.monotonic() + 3
+    while time.monotonic() < deadline:
+        if (tmp_path / "story.log").read_text(encoding="utf-8"):
+            break
+        time.sleep(0.05)
+    assert (tmp_path / "story.log").read_text(encoding="utf-8").endswith("idle\n")
+    story.close()
+
+
+def test_exit_hook_drains_open_writers(tmp_path):
+    bus = EventBus()
+    structured = StructuredLogger(tmp_path / "events.jsonl")
+    structured.FLUSH_INTERVAL_SEC = 3600
+    bus.subscribe(structured.handle)
+    bus.publish(Event(event_type=EventType.ACTION, actor="Amiya", data={"action": "wait"}))
+    assert (tmp_path / "events.jsonl").read_text(encoding="utf-8") == ""
+
+    _flush_live_writers()
+    assert json.loads((tmp_path / "events.jsonl").read_text(encoding="utf-8"))["actor"] == "Amiya"
+    structured.close()
+
+
+def test_story_logger_uses_event_time_not_data_timestamp(tmp_path):
+    bus = EventBus()
+    story = StoryLogger(tmp_path / "story.log")
+    bus.subscribe(story.handle)
+
+    published = bus.publish(
+        Event(
+            event_type=EventType.NARRATIVE,
+            actor="Amiya",
+            data={"text": "hi", "timestamp": "not-the-event-time"},
+        )
+    )
+    story.close()
+
+    line = (tmp_path / "story.log").read_text(encoding="utf-8").strip()
+    assert published.timestamp.isoformat() in line
+    assert "not-the-event-time" not in line
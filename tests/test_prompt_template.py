@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from src.main import build_sys_prompt
+
+
+def test_list_template_is_joined_with_real_newlines():
+    text = build_sys_prompt(
+        name="Amiya",
+        persona="",
+        appearance=None,
+        quotes=["  ", " 我会保护大家 "],
+        relation_brief=None,
+        weapon_brief=None,
+        allowed_names="Amiya, Doctor",
+        prompt_template=["你是{name}", "台词：{quotes}", "参与者：{allowed_names}"],
+    )
+    assert text == "你是Amiya\n台词：我会保护大家\n参与者：Amiya, Doctor"
+
+
+def test_unhashable_persona_is_formatted_uncached():
+    text = build_sys_prompt(
+        name="Amiya",
+        persona=["温柔", "坚定"],  # type: ignore[arg-type]
+        appearance=None,
+        quotes=None,
+        relation_brief=None,
+        weapon_brief=None,
+        allowed_names="Amiya",
+        prompt_template="{name}: {persona}",
+    )
+    assert text == "Amiya: ['温柔', '坚定']"
@@ -0,0 +1,19 @@
+from __future__ import annotations
+
+import world.tools as world_tools
+
+
+def test_events_stay_ordered_and_fire_as_prefix(monkeypatch):
+    monkeypatch.setattr(world_tools.WORLD, "events", [])
+    monkeypatch.setattr(world_tools.WORLD, "time_min", 0)
+
+    world_tools.schedule_event("late", 30)
+    world_tools.schedule_events([("early", 5, "先到"), ("tie", 30), ("mid", 10)])
+    world_tools.schedule_event("tie2", 30)
+    names = [ev["name"] for ev in world_tools.WORLD.events]
+    assert names == ["early", "mid", "late", "tie", "tie2"]
+
+    world_tools.WORLD.time_min = 10
+    res = world_tools.process_events()
+    assert res.metadata["fired"] == 2
+    assert [ev["name"] for ev in world_tools.WORLD.events] == ["late", "tie", "tie2"]
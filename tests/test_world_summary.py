@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import copy
+
+import pytest
+
+import src.main as main
+import world.tools as world_tools
+from src.main import _world_summary_text, _WorldPort
+
+
+@pytest.fixture(autouse=True)
+def isolated_world(monkeypatch):
+    """Run each test on a fresh WORLD with empty render caches; restore both afterwards."""
+    fresh = world_tools.World(version=world_tools.WORLD.version + 1)
+    monkeypatch.setattr(world_tools, "WORLD", fresh)
+    monkeypatch.setattr(main, "_SUMMARY_CACHE", None)
+    for attr in ("_snapshot_key", "_snapshot_cache", "_runtime_key", "_runtime_cache"):
+        monkeypatch.setattr(_WorldPort, attr, None)
+    return fresh
+
+
+def test_summary_is_reused_until_world_changes():
+    world_tools.set_position("Amiya", 1, 2)
+    first = _world_summary_text(world_tools.WORLD.snapshot())
+    assert "Amiya(1, 2)" in first
+    assert _world_summary_text(world_tools.WORLD.snapshot()) is first
+
+    world_tools.set_position("Amiya", 3, 4)
+    second = _world_summary_text(world_tools.WORLD.snapshot())
+    assert "Amiya(3, 4)" in second
+
+
+def test_reset_world_keeps_version_monotonic():
+    before = world_tools.WORLD.version
+    world_tools.reset_world()
+    assert world_tools.WORLD.version > before
+
+
+def test_world_port_snapshot_rebuilt_only_on_change():
+    first = _WorldPort.snapshot()
+    assert _WorldPort.snapshot() is first
+
+    world_tools.set_position("Amiya", 5, 6)
+    second = _WorldPort.snapshot()
+    assert second is not first
+    assert second["positions"]["Amiya"] == [5, 6]
+
+
+def test_world_port_runtime_rebuilt_only_on_change():
+    world_tools.set_position("Amiya", 0, 0)
+    first = _WorldPort.runtime()
+    assert _WorldPort.runtime() is first
+
+    world_tools.set_position("Amiya", 2, 0)
+    second = _WorldPort.runtime()
+    assert second is not first
+    assert tuple(second["positions"]["Amiya"]) == (2, 0)
+
+
+def test_engine_readers_leave_shared_snapshot_untouched():
+    # snapshot()/runtime() are shared caches: readers must not mutate them
+    world_tools.set_position("Amiya", 1, 1)
+    world_tools.set_position("Doctor", 2, 1)
+    world_tools.set_relation("Amiya", "Doctor", 40)
+    snap = _WorldPort.snapshot()
+    runtime = _WorldPort.runtime()
+    before_snap, before_runtime = copy.deepcopy(snap), copy.deepcopy(runtime)
+
+    _world_summary_text(snap)
+    for name in ("Amiya", "Doctor"):
+        main.relation_brief_for(_WorldPort, name)
+        main.weapon_brief_for(_WorldPort, name)
+        main.arts_brief_for(_WorldPort, name)
+        main.reach_preview_lines(_WorldPort, name)
+
+    assert _WorldPort.snapshot() is snap and snap == before_snap
+    assert _WorldPort.runtime() is runtime and runtime == before_runtime